@@ -1,6 +1,6 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from utils.auth_db import is_logged_in, get_user_role
+from utils.auth_db import is_logged_in, logout
 from ui.auth import auth_ui
 
 # ------------------- PAGE CONFIG & THEME -------------------
@@ -24,12 +24,6 @@ if not is_logged_in():
     st.title("🔐 Login / Sign Up")
     auth_ui()
     st.stop()
-if "role" not in st.session_state:
-    st.session_state["role"] = get_user_role()
-
-def logout():
-    st.session_state.clear()
-
 st.button("🔒 Logout", on_click=logout)
 
 selected = option_menu(
@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from models.spending_predictor import MODEL_VERSION, fit_ridge_batch, models_from_fit, predict_all, to_periods
+
+# Nightly forecasts for every user, trained from monthly_category_totals.
+# Users stream out of the database in primary key order and are cut into
+# tasks of FORECAST_USERS_PER_TASK users; at most two tasks per worker are
+# in flight, so memory stays bounded however many users there are.
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", os.cpu_count() or 1))
+FORECAST_HORIZONS = int(os.getenv("FORECAST_HORIZONS", 3))
+FORECAST_USERS_PER_TASK = int(os.getenv("FORECAST_USERS_PER_TASK", 2000))
+# Fresh worker interpreters, never a fork of a process holding database
+# connections and lock state.
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+KEYS = ["username", "category"]
+
+
+# ---------------------- WORKER ----------------------
+def _forecast(monthly: pd.DataFrame, horizons: int) -> tuple:
+    # Positive spend only, as on the Predict page.
+    monthly = monthly[monthly["total_spend"] > 0]
+    monthly = monthly.assign(month=to_periods(monthly["month"]))
+    fitted = fit_ridge_batch(monthly, KEYS)
+    models, _ = models_from_fit(fitted, KEYS)
+    return predict_all(models, monthly, horizons, KEYS), len(fitted)
+
+
+def _forecast_worker(task) -> dict:
+    """
+    Forecast one batch of users; never raises.
+
+    If the batch fails as a whole, users are retried one by one so a
+    single bad series only costs its own user.
+    """
+    monthly, horizons = task
+    started = time.perf_counter()
+    usernames = monthly["username"].unique().tolist()
+    try:
+        forecast, series = _forecast(monthly, horizons)
+        failed = []
+    except Exception:
+        frames, series, failed = [], 0, []
+        for username, rows in monthly.groupby("username", sort=False):
+            try:
+                user_forecast, user_series = _forecast(rows, horizons)
+                frames.append(user_forecast)
+                series += user_series
+            except Exception as e:
+                failed.append((username, str(e)))
+        forecast = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return {
+        "forecast": forecast,
+        "usernames": usernames,
+        "series": series,
+        "failed": failed,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# ---------------------- BATCHING ----------------------
+def _split_users(frame: pd.DataFrame, users_per_task: int):
+    codes = pd.factorize(frame["username"])[0]
+    for start in range(0, codes.max() + 1 if len(codes) else 0, users_per_task):
+        yield frame[(codes >= start) & (codes < start + users_per_task)]
+
+
+def user_batches(chunks, users_per_task: int = FORECAST_USERS_PER_TASK):
+    """
+    Regroup row chunks ordered by username into frames of whole users.
+
+    A user whose rows straddle two chunks is held back until the next one.
+    """
+    buffered = None
+    for chunk in chunks:
+        buffered = chunk if buffered is None else pd.concat([buffered, chunk], ignore_index=True)
+        users = buffered["username"].unique()
+        if len(users) <= users_per_task:
+            continue
+        # Everything before the last (possibly incomplete) user is final.
+        complete = (buffered["username"] != users[-1]).to_numpy()
+        yield from _split_users(buffered[complete], users_per_task)
+        buffered = buffered[~complete].reset_index(drop=True)
+
+    if buffered is not None:
+        yield from _split_users(buffered, users_per_task)
+
+
+# ---------------------- RUN ----------------------
+def run_forecasts(storage=None, horizons: int = FORECAST_HORIZONS, max_workers: int = FORECAST_WORKERS,
+                  users_per_task: int = FORECAST_USERS_PER_TASK) -> dict:
+    """
+    Forecast every user and bulk-write the results to `forecasts`.
+
+    Returns the run report (also stored in `forecast_runs`): run_id,
+    started_at, seconds, users, series, forecasts, failed_users,
+    users_per_second, series_per_second and the first few failures.
+    """
+    if storage is None:
+        from utils.storage import get_storage
+        storage = get_storage()
+
+    started_at = pd.Timestamp.now().floor("s")
+    run_id = time.time_ns() // 1_000_000
+    started = time.perf_counter()
+    report = {"run_id": run_id, "started_at": started_at.to_pydatetime(),
+              "users": 0, "series": 0, "forecasts": 0, "failed_users": 0, "failures": []}
+
+    def collect(result):
+        forecast = result["forecast"]
+        if not forecast.empty:
+            forecast = forecast.assign(model_version=MODEL_VERSION, run_id=run_id)
+        # Every user of the batch is replaced, so one whose series no
+        # longer train loses the forecasts of an earlier run.
+        report["forecasts"] += storage.save_forecasts(forecast, result["usernames"])
+        report["users"] += len(result["usernames"])
+        report["series"] += result["series"]
+        report["failed_users"] += len(result["failed"])
+        report["failures"].extend(result["failed"][:10 - len(report["failures"])])
+
+    tasks = ((batch, horizons) for batch in user_batches(storage.iter_monthly_totals(), users_per_task))
+    if max_workers <= 1:
+        for task in tasks:
+            collect(_forecast_worker(task))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=POOL_CONTEXT) as pool:
+            in_flight = set()
+            for task in tasks:
+                in_flight.add(pool.submit(_forecast_worker, task))
+                if len(in_flight) >= 2 * max_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+            for future in in_flight:
+                collect(future.result())
+
+    report["seconds"] = time.perf_counter() - started
+    report["users_per_second"] = report["users"] / report["seconds"] if report["seconds"] else 0.0
+    report["series_per_second"] = report["series"] / report["seconds"] if report["seconds"] else 0.0
+    storage.record_forecast_run(report)
+    return report
+
+
+if __name__ == "__main__":
+    horizons = int(sys.argv[1]) if len(sys.argv) > 1 else FORECAST_HORIZONS
+    report = run_forecasts(horizons=horizons)
+    print(
+        f"Run {report['run_id']}: {report['users']} users, {report['series']} series, "
+        f"{report['forecasts']} forecasts in {report['seconds']:.1f}s "
+        f"({report['users_per_second']:.0f} users/s, {report['series_per_second']:.0f} series/s); "
+        f"{report['failed_users']} user(s) failed."
+    )
+    for username, error in report["failures"]:
+        print(f"  {username}: {error}")
+    if report["failed_users"]:
+        sys.exit(1)
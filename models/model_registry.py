@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from models.spending_predictor import (
+    MODEL_VERSION, empty_statistics, fit_from_statistics, fit_ridge_batch, models_from_fit,
+    to_periods, update_statistics,
+)
+
+# Trained per-user category models, one Parquet file of coefficients and
+# metrics per (user, data fingerprint, model version). Same data and same
+# version means the same models, so a hit never retrains; the registry
+# survives restarts and is shared by every server process on the host.
+REGISTRY_DIR = os.path.join("data", "models")
+MAX_REGISTRY_BYTES = int(os.getenv("MODEL_REGISTRY_MAX_MB", 256)) * 1024 * 1024
+# Train misses from each user's persisted sufficient statistics, folding in
+# only the months after the ones already seen (0 = always refit in full).
+INCREMENTAL = os.getenv("MODEL_INCREMENTAL", "1") == "1"
+# The frames of a statistics state; stored as one Parquet file, one tagged
+# block of rows each, with the scalars in the file's metadata.
+STATE_FRAMES = ("stats", "recent", "holdout")
+STATE_METADATA_KEY = b"expenxo.statistics"
+
+
+# ---------------------- KEYS ----------------------
+def data_fingerprint(monthly_df: pd.DataFrame) -> str:
+    """Order-independent hash of the (month, category, total_spend) rows."""
+    canonical = pd.DataFrame({
+        "month": monthly_df["month"].astype(str),
+        "category": monthly_df["category"].astype(str),
+        "total_spend": monthly_df["total_spend"].astype(float).round(2),
+    }).sort_values(["category", "month"], kind="stable")
+    row_hashes = pd.util.hash_pandas_object(canonical, index=False)
+    return hashlib.sha256(row_hashes.to_numpy().tobytes()).hexdigest()[:20]
+
+
+def _user_key(username: str) -> str:
+    return hashlib.sha256(str(username).encode()).hexdigest()[:16]
+
+
+def entry_path(username: str, fingerprint: str, version: str = MODEL_VERSION) -> str:
+    return os.path.join(REGISTRY_DIR, f"{_user_key(username)}_{version}_{fingerprint}.parquet")
+
+
+def statistics_path(username: str, version: str = MODEL_VERSION) -> str:
+    return os.path.join(REGISTRY_DIR, f"{_user_key(username)}_{version}_stats.parquet")
+
+
+# ---------------------- REGISTRY ----------------------
+def load_fit(username: str, fingerprint: str):
+    """The stored fit frame for this key, or None on a miss."""
+    path = entry_path(username, fingerprint)
+    if not os.path.exists(path):
+        return None
+    try:
+        fitted = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Discarding unreadable model entry {path}: {e}")
+        os.remove(path)
+        return None
+    os.utime(path)
+    return fitted
+
+
+def save_fit(username: str, fingerprint: str, fitted: pd.DataFrame):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    path = entry_path(username, fingerprint)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    fitted.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def load_statistics(username: str):
+    path = statistics_path(username)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[STATE_METADATA_KEY])
+        rows = table.to_pandas()
+        state = {
+            name: rows.loc[rows["_frame"] == name, meta["columns"][name]].reset_index(drop=True)
+            for name in STATE_FRAMES
+        }
+        state["through_month"] = pd.Period(meta["through_month"], freq="M")
+        state["fingerprint"] = meta["fingerprint"]
+    except Exception as e:
+        print(f"Discarding unreadable model statistics {path}: {e}")
+        os.remove(path)
+        return None
+    os.utime(path)
+    return state
+
+
+def save_statistics(username: str, state: dict):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    path = statistics_path(username)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+    blocks = [state[name].assign(_frame=name) for name in STATE_FRAMES]
+    non_empty = [b for b in blocks if not b.empty]
+    if non_empty:
+        rows = pd.concat(non_empty, ignore_index=True)
+    else:
+        rows = pd.DataFrame(columns=list(dict.fromkeys(c for b in blocks for c in b.columns)))
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    meta = {
+        "columns": {name: list(state[name].columns) for name in STATE_FRAMES},
+        "through_month": str(state["through_month"]),
+        "fingerprint": state["fingerprint"],
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), STATE_METADATA_KEY: json.dumps(meta).encode(),
+    })
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train_incremental(username: str, monthly_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fit frame for `monthly_df`, folding only months newer than the user's
+    stored statistics into them.
+
+    The stored state remembers the last month it covers and a fingerprint
+    of the rows up to it; if those rows changed (a re-upload, a late
+    month), the statistics are rebuilt from scratch instead.
+    """
+    monthly_df = monthly_df.assign(month=to_periods(monthly_df["month"]))
+    state = load_statistics(username)
+    new_rows = monthly_df
+    if state is not None:
+        through = state["through_month"]
+        seen = monthly_df["month"] <= through
+        if data_fingerprint(monthly_df[seen]) == state["fingerprint"]:
+            new_rows = monthly_df[~seen]
+        else:
+            state = None
+    if state is None:
+        state = empty_statistics()
+
+    if not new_rows.empty or "through_month" not in state:
+        state = update_statistics(state, new_rows)
+        state["through_month"] = monthly_df["month"].max()
+        state["fingerprint"] = data_fingerprint(monthly_df)
+        save_statistics(username, state)
+    return fit_from_statistics(state)
+
+
+def get_models(username: str, monthly_df: pd.DataFrame):
+    """
+    models_dict, metrics_dict for the user's monthly data, trained only
+    when the registry has no entry for this exact data and model version.
+    """
+    monthly_df = monthly_df.copy()
+    monthly_df["month"] = to_periods(monthly_df["month"])
+    fingerprint = data_fingerprint(monthly_df)
+
+    fitted = load_fit(username, fingerprint)
+    if fitted is None:
+        fitted = train_incremental(username, monthly_df) if INCREMENTAL else fit_ridge_batch(monthly_df)
+        save_fit(username, fingerprint, fitted)
+        evict()
+    return models_from_fit(fitted)
+
+
+# ---------------------- RETENTION ----------------------
+def evict(max_bytes: int = MAX_REGISTRY_BYTES) -> dict:
+    """Remove the least recently used entries until the registry fits in `max_bytes`."""
+    if not os.path.isdir(REGISTRY_DIR):
+        return {"removed": 0, "freed_bytes": 0, "total_bytes": 0}
+
+    entries = []
+    for name in os.listdir(REGISTRY_DIR):
+        path = os.path.join(REGISTRY_DIR, name)
+        if name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed, freed = 0, 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        freed += size
+        removed += 1
+
+    return {"removed": removed, "freed_bytes": freed, "total_bytes": total}
+
+
+if __name__ == "__main__":
+    report = evict()
+    print(
+        f"Removed {report['removed']} model(s), freed {report['freed_bytes'] / 1024:.0f} KiB; "
+        f"{report['total_bytes'] / 1024:.0f} KiB kept."
+    )
@@ -1,7 +1,266 @@
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import Ridge
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+
+
+# Bump whenever features or the fit change, so stored models are retrained.
+MODEL_VERSION = "ridge-lag1-roll3-v1"
+FEATURES = ["lag_1", "roll_3"]
+RIDGE_ALPHA = 1.0
+MIN_TRAIN_ROWS = 3
+TRAIN_FRACTION = 0.8
+FIT_COLUMNS = ["coef_lag_1", "coef_roll_3", "intercept", "n_train", "mae", "rmse"]
+
+
+class SeriesModel:
+    """Ridge coefficients of one series; predicts like a fitted sklearn Ridge."""
+
+    __slots__ = ("coef_", "intercept_")
+
+    def __init__(self, coef, intercept):
+        self.coef_ = np.asarray(coef, dtype=float)
+        self.intercept_ = float(intercept)
+
+    def predict(self, X):
+        X = X[FEATURES].to_numpy(dtype=float) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=float)
+        return X @ self.coef_ + self.intercept_
+
+
+def to_periods(months) -> pd.PeriodIndex:
+    """Monthly PeriodIndex, parsing each distinct month label only once."""
+    if isinstance(months, (pd.PeriodIndex, pd.Series)) and isinstance(months.dtype, pd.PeriodDtype):
+        return pd.PeriodIndex(months)
+    codes, uniques = pd.factorize(np.asarray(months))
+    return pd.PeriodIndex(uniques, freq="M")[codes]
+
+
+def series_features(monthly_df: pd.DataFrame, keys):
+    """
+    Sort by (keys, month) and compute lag_1 / roll_3 for every row at once.
+
+    Returns (sorted frame, group codes, position of each row in its series).
+    """
+    df = monthly_df.sort_values([*keys, "month"], kind="stable").reset_index(drop=True)
+    codes = df.groupby(keys, sort=False, observed=True).ngroup().to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(df)])
+    position = np.arange(len(df)) - np.repeat(starts, sizes)
+
+    y = df["total_spend"].to_numpy(dtype=float)
+    lag_1 = np.full(len(df), np.nan)
+    roll_3 = np.full(len(df), np.nan)
+    lag_1[1:] = y[:-1]
+    roll_3[2:] = (y[2:] + y[1:-1] + y[:-2]) / 3
+    lag_1[position < 1] = np.nan
+    roll_3[position < 2] = np.nan
+    df["lag_1"] = lag_1
+    df["roll_3"] = roll_3
+    return df, codes, position
+
+
+def fit_ridge_batch(monthly_df: pd.DataFrame, keys=("category",), alpha: float = RIDGE_ALPHA):
+    """
+    Fit Ridge(alpha) on (lag_1, roll_3) for every series in one vectorized solve.
+
+    Each series trains on its first 80% of usable rows and is scored on the
+    rest, exactly like a per-series sklearn fit. Returns a frame with one
+    row per trained series: keys, coef_lag_1, coef_roll_3, intercept,
+    n_train, mae, rmse.
+    """
+    keys = list(keys)
+    df, codes, _ = series_features(monthly_df, keys)
+    usable = np.isfinite(df["lag_1"].to_numpy()) & np.isfinite(df["roll_3"].to_numpy()) \
+        & np.isfinite(df["total_spend"].to_numpy(dtype=float))
+    df = df[usable].reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame(columns=[*keys, *FIT_COLUMNS])
+
+    _, codes = np.unique(codes[usable], return_inverse=True)
+    n_groups = codes.max() + 1
+    counts = np.bincount(codes, minlength=n_groups)
+    rank = np.arange(len(df)) - np.repeat(np.cumsum(counts) - counts, counts)
+    split = np.maximum(1, (counts * TRAIN_FRACTION).astype(int))
+    train = rank < split[codes]
+
+    x1 = df["lag_1"].to_numpy()
+    x2 = df["roll_3"].to_numpy()
+    y = df["total_spend"].to_numpy(dtype=float)
+
+    # Centered normal equations per series (the intercept is not penalized).
+    def train_sum(values):
+        return np.bincount(codes[train], weights=values[train], minlength=n_groups)
+
+    n = split.astype(float)
+    m1, m2, my = train_sum(x1) / n, train_sum(x2) / n, train_sum(y) / n
+    c1, c2, cy = x1 - m1[codes], x2 - m2[codes], y - my[codes]
+    a11 = train_sum(c1 * c1) + alpha
+    a12 = train_sum(c1 * c2)
+    a22 = train_sum(c2 * c2) + alpha
+    b1, b2 = train_sum(c1 * cy), train_sum(c2 * cy)
+
+    det = a11 * a22 - a12 * a12
+    w1 = (a22 * b1 - a12 * b2) / det
+    w2 = (a11 * b2 - a12 * b1) / det
+    intercept = my - w1 * m1 - w2 * m2
+
+    test = ~train
+    error = y - (intercept[codes] + w1[codes] * x1 + w2[codes] * x2)
+    n_test = np.bincount(codes[test], minlength=n_groups)
+    abs_sum = np.bincount(codes[test], weights=np.abs(error[test]), minlength=n_groups)
+    sq_sum = np.bincount(codes[test], weights=error[test] ** 2, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mae = np.where(n_test > 0, abs_sum / n_test, 0.0)
+        rmse = np.where(n_test > 0, np.sqrt(sq_sum / n_test), 0.0)
+
+    first = np.r_[0, np.cumsum(counts)[:-1]]
+    fitted = df.loc[first, keys].reset_index(drop=True)
+    fitted["coef_lag_1"] = w1
+    fitted["coef_roll_3"] = w2
+    fitted["intercept"] = intercept
+    fitted["n_train"] = split
+    fitted["mae"] = mae
+    fitted["rmse"] = rmse
+    return fitted[counts >= MIN_TRAIN_ROWS].reset_index(drop=True)
+
+
+# ---------------------- INCREMENTAL ----------------------
+# A ridge fit only needs per-series sums over its training rows, so the
+# state kept between runs is:
+#   stats   - keys, n_usable, n_train and the STAT_SUMS of the folded rows
+#   recent  - the last two raw rows of each series (for the next lag/roll)
+#   holdout - usable rows not folded yet: the series' scoring tail
+# New months are featurized against `recent`, appended to the holdout, and
+# as the 80% training prefix grows the oldest holdout rows fold into stats.
+STAT_SUMS = ["s_1", "s_2", "s_y", "s_11", "s_12", "s_22", "s_1y", "s_2y"]
+HOLDOUT_COLUMNS = ["month", "lag_1", "roll_3", "total_spend"]
+
+
+def empty_statistics(keys=("category",)) -> dict:
+    keys = list(keys)
+    return {
+        "stats": pd.DataFrame(columns=[*keys, "n_usable", "n_train", *STAT_SUMS]),
+        "recent": pd.DataFrame(columns=[*keys, "month", "total_spend"]),
+        "holdout": pd.DataFrame(columns=[*keys, *HOLDOUT_COLUMNS]),
+    }
+
+
+def _concat(frames) -> pd.DataFrame:
+    non_empty = [f for f in frames if not f.empty]
+    return pd.concat(non_empty, ignore_index=True) if non_empty else frames[0].iloc[:0]
+
+
+def _key_index(frame: pd.DataFrame, keys) -> pd.Index:
+    return pd.MultiIndex.from_frame(frame[keys]) if len(keys) > 1 else pd.Index(frame[keys[0]])
+
+
+def _row_sums(rows: pd.DataFrame, keys) -> pd.DataFrame:
+    x1, x2, y = rows["lag_1"], rows["roll_3"], rows["total_spend"]
+    sums = pd.DataFrame({
+        **{k: rows[k] for k in keys},
+        "n_train": 1,
+        "s_1": x1, "s_2": x2, "s_y": y,
+        "s_11": x1 * x1, "s_12": x1 * x2, "s_22": x2 * x2,
+        "s_1y": x1 * y, "s_2y": x2 * y,
+    })
+    return sums.groupby(keys, observed=True).sum()
+
+
+def update_statistics(state: dict, new_rows: pd.DataFrame, keys=("category",)) -> dict:
+    """
+    Fold months newer than everything in `state` into it.
+
+    Work is proportional to the new rows plus the holdout tails they touch;
+    rows already folded are never revisited.
+    """
+    keys = list(keys)
+    new_rows = new_rows[[*keys, "month", "total_spend"]]
+    recent = state["recent"]
+
+    combined = _concat([recent.assign(_context=True), new_rows.assign(_context=False)])
+    featured, _, _ = series_features(combined, keys)
+    fresh = featured[~featured["_context"].astype(bool)]
+    usable = fresh[["lag_1", "roll_3", "total_spend"]].notna().all(axis=1)
+    holdout = _concat([state["holdout"], fresh.loc[usable, [*keys, *HOLDOUT_COLUMNS]]]).sort_values([*keys, "month"], kind="stable").reset_index(drop=True)
+
+    recent = (
+        featured[[*keys, "month", "total_spend"]]
+        .groupby(keys, sort=False, observed=True).tail(2)
+        .reset_index(drop=True)
+    )
+
+    stats = state["stats"].set_index(keys).astype(float)
+    arrived = fresh[usable].groupby(keys, observed=True).size()
+    stats = stats.reindex(stats.index.union(arrived.index), fill_value=0.0)
+    stats["n_usable"] += arrived.reindex(stats.index, fill_value=0)
+
+    # Fold holdout rows that now fall inside each series' training prefix.
+    split = np.maximum(1, (stats["n_usable"] * TRAIN_FRACTION).astype(int))
+    room = (np.minimum(split, stats["n_usable"]) - stats["n_train"]).astype(int)
+    rank = holdout.groupby(keys, sort=False, observed=True).cumcount().to_numpy()
+    fold = rank < room.reindex(_key_index(holdout, keys)).to_numpy()
+    if fold.any():
+        folded = _row_sums(holdout[fold], keys)
+        stats.loc[folded.index, folded.columns] += folded
+        holdout = holdout[~fold].reset_index(drop=True)
+
+    return {
+        "stats": stats.reset_index(),
+        "recent": recent,
+        "holdout": holdout,
+    }
+
+
+def fit_from_statistics(state: dict, keys=("category",), alpha: float = RIDGE_ALPHA) -> pd.DataFrame:
+    """Solve every series from its sums; same output as fit_ridge_batch."""
+    keys = list(keys)
+    stats = state["stats"]
+    stats = stats[stats["n_usable"] >= MIN_TRAIN_ROWS].reset_index(drop=True)
+    if stats.empty:
+        return pd.DataFrame(columns=[*keys, *FIT_COLUMNS])
+
+    n = stats["n_train"].to_numpy(dtype=float)
+    s = {name: stats[name].to_numpy(dtype=float) for name in STAT_SUMS}
+    m1, m2, my = s["s_1"] / n, s["s_2"] / n, s["s_y"] / n
+    a11 = s["s_11"] - n * m1 * m1 + alpha
+    a12 = s["s_12"] - n * m1 * m2
+    a22 = s["s_22"] - n * m2 * m2 + alpha
+    b1 = s["s_1y"] - n * m1 * my
+    b2 = s["s_2y"] - n * m2 * my
+
+    det = a11 * a22 - a12 * a12
+    fitted = stats[keys].copy()
+    fitted["coef_lag_1"] = (a22 * b1 - a12 * b2) / det
+    fitted["coef_roll_3"] = (a11 * b2 - a12 * b1) / det
+    fitted["intercept"] = my - fitted["coef_lag_1"] * m1 - fitted["coef_roll_3"] * m2
+    fitted["n_train"] = stats["n_train"].astype(int)
+
+    scored = state["holdout"].merge(fitted, on=keys)
+    error = scored["total_spend"] - (
+        scored["intercept"] + scored["coef_lag_1"] * scored["lag_1"] + scored["coef_roll_3"] * scored["roll_3"]
+    )
+    scores = (
+        pd.DataFrame({**{k: scored[k] for k in keys}, "abs": error.abs(), "sq": error ** 2})
+        .groupby(keys, observed=True).mean()
+    )
+    scores = scores.reindex(_key_index(fitted, keys))
+    fitted["mae"] = scores["abs"].fillna(0.0).to_numpy()
+    fitted["rmse"] = np.sqrt(scores["sq"].fillna(0.0).to_numpy())
+    return fitted[[*keys, *FIT_COLUMNS]]
+
+
+def models_from_fit(fitted: pd.DataFrame, keys=("category",)):
+    """models_dict, metrics_dict keyed by category (or by tuple for several keys)."""
+    keys = list(keys)
+    index = fitted[keys[0]] if len(keys) == 1 else pd.MultiIndex.from_frame(fitted[keys])
+    coefs = fitted[["coef_lag_1", "coef_roll_3"]].to_numpy()
+    models = {
+        key: SeriesModel(coef, b)
+        for key, coef, b in zip(index, coefs, fitted["intercept"].to_numpy())
+    }
+    metrics = {
+        key: (float(mae), float(rmse))
+        for key, mae, rmse in zip(index, fitted["mae"].to_numpy(), fitted["rmse"].to_numpy())
+    }
+    return models, metrics
 
 
 def train_models_by_category(monthly_df: pd.DataFrame):
@@ -9,58 +268,72 @@ def train_models_by_category(monthly_df: pd.DataFrame):
     Train one model per category using lag features.
 
     Expected columns:
-    month | category | total_spend
+    month | category | total_spend   (plus username to train every user at once;
+    keys then become (username, category))
 
     Returns:
     models_dict, metrics_dict
     """
 
-    df = monthly_df.copy()
-
     required_cols = {"month", "category", "total_spend"}
-    if not required_cols.issubset(df.columns):
+    if not required_cols.issubset(monthly_df.columns):
         raise ValueError(f"Expected columns {required_cols}")
 
-    df["month"] = pd.PeriodIndex(df["month"], freq="M")
-    df = df.sort_values(["category", "month"])
-
-    models = {}
-    metrics = {}
+    df = monthly_df.copy()
+    df["month"] = to_periods(df["month"])
 
-    for category, g in df.groupby("category"):
-        g = g.copy()
+    keys = ["username", "category"] if "username" in df.columns else ["category"]
+    return models_from_fit(fit_ridge_batch(df, keys), keys)
 
-        # --- Lag features ---
-        g["lag_1"] = g["total_spend"].shift(1)
-        g["roll_3"] = g["total_spend"].rolling(3).mean()
 
-        g = g.dropna()
+def predict_all(models, history_df: pd.DataFrame, horizons: int = 1, keys=("category",)) -> pd.DataFrame:
+    """
+    Forecast every modelled series for the next `horizons` months at once.
 
-        if len(g) < 3:
-            continue
+    Steps beyond the first feed each prediction back in as the newest
+    month (recursive rollout). Returns one row per series and step:
+    keys | horizon | month | prediction.
+    """
+    keys = list(keys)
+    columns = [*keys, "horizon", "month", "prediction"]
+    if not models or history_df.empty:
+        return pd.DataFrame(columns=columns)
 
-        X = g[["lag_1", "roll_3"]]
-        y = g["total_spend"]
+    history = history_df.assign(month=to_periods(history_df["month"]))
+    history = history.sort_values([*keys, "month"], kind="stable")
+    tail = history.groupby(keys, sort=False, observed=True).tail(3)
+    index = _key_index(tail, keys)
+    tail = tail[index.isin(list(models))]
+    if tail.empty:
+        return pd.DataFrame(columns=columns)
 
-        split_idx = max(1, int(len(g) * 0.8))
+    # (series x 3) window of the latest months, oldest first, NaN-padded.
+    codes, series = pd.factorize(_key_index(tail, keys))
+    slot = tail.groupby(keys, sort=False, observed=True).cumcount(ascending=False).to_numpy()
+    window = np.full((len(series), 3), np.nan)
+    window[codes, 2 - slot] = tail["total_spend"].to_numpy(dtype=float)
+    last_month = tail.groupby(codes)["month"].max().sort_index()
 
-        X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
-        y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
+    coef = np.array([models[key].coef_ for key in series])
+    intercept = np.array([models[key].intercept_ for key in series])
 
-        model = Ridge(alpha=1.0)
-        model.fit(X_train, y_train)
+    predictions = np.empty((len(series), horizons))
+    for h in range(horizons):
+        features = np.column_stack([window[:, -1], np.nanmean(window, axis=1)])
+        step = np.maximum(0.0, np.einsum("ij,ij->i", features, coef) + intercept)
+        predictions[:, h] = step
+        window = np.column_stack([window[:, 1:], step])
 
-        if len(X_test) > 0:
-            preds = model.predict(X_test)
-            mae = mean_absolute_error(y_test, preds)
-            rmse = np.sqrt(mean_squared_error(y_test, preds))
-        else:
-            mae, rmse = 0.0, 0.0
+    steps = np.arange(1, horizons + 1)
+    months = pd.PeriodIndex(np.repeat(last_month.to_numpy(), horizons)) + np.tile(steps, len(series))
+    forecast = series.set_names(keys).to_frame(index=False)
+    forecast = forecast.loc[np.repeat(np.arange(len(series)), horizons)].reset_index(drop=True)
+    forecast["horizon"] = np.tile(steps, len(series))
+    forecast["month"] = months.astype(str)
+    forecast["prediction"] = predictions.ravel()
+    return forecast[columns]
 
-        models[category] = model
-        metrics[category] = (mae, rmse)
 
-    return models, metrics
 def predict_next_month(models, history_df, category: str):
     """
     Predict next month's spending for a category.
@@ -1,18 +1,39 @@
 import streamlit as st
 import pandas as pd
 
-from models.spending_predictor import train_models_by_category, predict_next_month
-
-
-@st.cache_resource
-def train_cached_models(monthly_df):
-    monthly_df = monthly_df.sort_values(["category", "month"]).reset_index(drop=True)
-    return train_models_by_category(monthly_df)
+from models.model_registry import get_models
+from models.spending_predictor import predict_all
+from scripts.normalize import is_normalized
+from utils.auth_db import get_current_username
+from utils.storage import get_storage
+
+
+def show_stored_forecast(username):
+    """Forecasts written by the nightly job (models.forecast_job), if any."""
+    try:
+        rows = get_storage().get_forecasts(username) if username else []
+    except Exception as e:
+        print("Error loading stored forecasts:", e)
+        return
+    if not rows:
+        return
+
+    stored = pd.DataFrame(rows)
+    st.subheader("🌙 Nightly Forecast")
+    st.caption(f"Computed from all your stored transactions on {stored['generated_at'].max()}.")
+    st.dataframe(
+        stored.pivot(index="category", columns="month", values="prediction")
+        .astype(float)
+        .round(2),
+        use_container_width=True
+    )
 
 
 def show():
     st.subheader("🔮 Spending Prediction")
 
+    show_stored_forecast(get_current_username())
+
     # ==================== REQUIRE UPLOADED DATA ====================
     if "df" not in st.session_state:
         st.markdown(
@@ -31,7 +52,8 @@ def show():
         st.stop()
 
     # ==================== PREP DATA ====================
-    df["date"] = pd.to_datetime(df["date"])
+    if not is_normalized(df):
+        df["date"] = pd.to_datetime(df["date"])
     df["month"] = df["date"].dt.to_period("M").astype(str)
 
     df["category"] = (
@@ -56,7 +78,7 @@ def show():
 
     # ==================== TRAIN MODELS ====================
     with st.spinner("Training prediction model..."):
-        models, metrics = train_cached_models(monthly)
+        models, metrics = get_models(get_current_username() or "guest", monthly)
 
     if not models:
         st.markdown(
@@ -107,14 +129,16 @@ def show():
         unsafe_allow_html=True
     )
 
-    # ==================== NEXT MONTH PREDICTION ====================
+    # ==================== FORECAST (ALL CATEGORIES) ====================
+    horizon = st.slider("Months to forecast", min_value=1, max_value=6, value=1)
+    forecast = predict_all(models, monthly, horizons=horizon)
+    # The report forecasts its own data over the same horizon.
+    st.session_state["forecast_horizon"] = horizon
+
     st.subheader("📅 Predict Next Month")
 
-    prediction = predict_next_month(
-        models=models,
-        history_df=monthly,
-        category=selected_category
-    )
+    selected_forecast = forecast[forecast["category"] == selected_category]
+    prediction = float(selected_forecast["prediction"].iloc[0]) if not selected_forecast.empty else 0.0
 
     st.markdown(
         f"<div class='custom-alert-success'>✅ Predicted "
@@ -123,6 +147,13 @@ def show():
         unsafe_allow_html=True
     )
 
+    st.subheader("🗂️ Forecast for All Categories")
+    st.dataframe(
+        forecast.pivot(index="category", columns="month", values="prediction")
+        .round(2),
+        use_container_width=True
+    )
+
     # ==================== TRANSPARENCY ====================
     with st.expander("🔍 Last 3 Months Used for Prediction"):
         st.dataframe(
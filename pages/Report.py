@@ -6,7 +6,11 @@ from vl_convert import vegalite_to_png
 
 from utils.chart_utils import generate_chart, generate_budget_vs_actual_chart
 from reports.report_generator import generate_pdf_report
+from utils.auth_db import get_current_username
 from utils.budget_manager import get_all_budgets
+from models.model_registry import get_models
+from models.spending_predictor import predict_all
+from scripts.normalize import is_normalized
 
 
 def show():
@@ -21,8 +25,9 @@ def show():
 
     # -------------------- ENSURE MONTH COLUMN --------------------
     if "month" not in df.columns:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df.dropna(subset=["date"])
+        if not is_normalized(df):
+            df["date"] = pd.to_datetime(df["date"], errors="coerce")
+            df = df.dropna(subset=["date"])
         df["month"] = df["date"].dt.to_period("M").astype(str)
 
     # -------------------- METRICS FROM PREDICT --------------------
@@ -58,6 +63,28 @@ def show():
     )
 
 
+def report_forecast(df):
+    """
+    Forecast of the transactions in this report, over the horizon last
+    picked on the Predict page. Models come from the registry, so data
+    already seen there is not retrained.
+    """
+    spend = df[df["amount"] > 0]
+    monthly = (
+        spend.assign(category=spend["category"].astype(str).str.lower().str.strip())
+        .groupby(["month", "category"], as_index=False)
+        .agg(total_spend=("amount", "sum"))
+    )
+    if monthly.empty:
+        return None
+    try:
+        models, _ = get_models(get_current_username() or "guest", monthly)
+    except Exception as e:
+        print("Error training forecast models:", e)
+        return None
+    return predict_all(models, monthly, horizons=st.session_state.get("forecast_horizon", 1))
+
+
 def report_ui(
     df,
     selected_months,
@@ -114,6 +141,7 @@ def report_ui(
                 budget_df=get_all_budgets(),
                 mae=mae,
                 rmse=rmse,
+                forecast_df=report_forecast(df),
             )
 
             with open(report_path, "rb") as f:
@@ -1,72 +1,44 @@
 import streamlit as st
 import pandas as pd
 import os
-import uuid
+from contextlib import nullcontext
 
-from scripts.csv_parser import parse_csv
-from utils.auth_db import get_logged_in_user, get_db_connection
+from scripts.batch_parser import parse_statements
+from scripts.csv_parser import iter_csv_chunks, iter_frame_chunks, resolve_layout
+from scripts.normalize import mark_normalized
+from utils.auth_db import get_current_username
+from utils.budget_plan import expand_budget_plan, plan_records
+from utils.category_mapper import fill_categories
+from utils.storage import get_storage
+from utils.upload_store import content_hash, save_raw, load_parsed, parsed_key, parsed_writer, gc_store
 
 
 def show():
     st.title("📤 Upload Files")
     os.makedirs("data", exist_ok=True)
 
-    current_user = get_logged_in_user()
-
-    # -------------------- ENSURE USER EXISTS --------------------
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT username FROM users WHERE username=%s",
-            (current_user,)
-        )
-
-        if not cursor.fetchone():
-            cursor.execute(
-                """
-                INSERT INTO users
-                (username, first_name, last_name, contact, email, password_, role)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    current_user,
-                    current_user,
-                    current_user,
-                    "9999999999",
-                    f"{current_user}@example.com",
-                    "password",
-                    "user",
-                ),
-            )
-            conn.commit()
-
-        conn.close()
-
-    except Exception as e:
+    # The identity cached at login already proves the account exists.
+    current_user = get_current_username()
+    if current_user is None:
         st.markdown(
-            f"<div class='custom-alert-error'>❌ Failed to ensure user exists: {e}</div>",
+            "<div class='custom-alert-error'>❌ Your session has expired. Please log in again.</div>",
             unsafe_allow_html=True
         )
         return
 
     # -------------------- TRANSACTION UPLOAD --------------------
-    st.markdown("### 🏦 Upload Bank Statement (.csv only)")
+    st.markdown("### 🏦 Upload Bank Statements (.csv only)")
 
-    uploaded_file = st.file_uploader(
-        "Choose Transaction File",
+    uploaded_files = st.file_uploader(
+        "Choose Transaction File(s)",
         type=["csv"],
         key="bank_upload",
+        accept_multiple_files=True,
     )
 
-    if uploaded_file is not None:
-        filename = f"transactions_{uuid.uuid4().hex}.csv"
-        path = os.path.join("data", filename)
-
+    if uploaded_files:
         try:
-            with open(path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
+            stored = [save_raw(f.getvalue(), "transactions") for f in uploaded_files]
         except PermissionError:
             st.markdown(
                 "<div class='custom-alert-error'>❌ Please close the CSV file and try again.</div>",
@@ -74,18 +46,71 @@ def show():
             )
             return
 
-        st.session_state["transaction_file"] = path
+        st.session_state["transaction_file"] = (
+            stored[0][1] if len(stored) == 1 else [path for _, path in stored]
+        )
 
         try:
-            # ---- PARSE CSV ----
-            df = parse_csv(path)
-
-            # ---- CANONICAL CLEANUP ----
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
-            df = df.dropna(subset=["date", "amount"])
+            reports = None
+
+            if len(stored) == 1:
+                # ---- SINGLE FILE: STREAM CHUNK BY CHUNK ----
+                digest, path = stored[0]
+
+                # A re-upload of a known file with an unchanged layout and
+                # parser skips parsing entirely.
+                layout = resolve_layout(path)
+                key = parsed_key(layout)
+                cached = load_parsed("transactions", digest, key)
+                chunks = iter_frame_chunks(cached) if cached is not None else iter_csv_chunks(path, layout=layout)
+                save_chunks = cached is None
+            else:
+                # ---- MULTIPLE FILES: PARSE IN PARALLEL, MERGE ONCE ----
+                with st.spinner(f"Parsing {len(stored)} files..."):
+                    merged, reports = parse_statements(
+                        (f.name, path, digest)
+                        for f, (digest, path) in zip(uploaded_files, stored)
+                    )
+                if merged is None:
+                    raise ValueError("No file could be parsed.")
+
+                digest = content_hash("".join(sorted(d for d, _ in stored)).encode())
+                chunks = iter_frame_chunks(merged)
+                save_chunks = False
+
+            # Only rows not already stored for this user are inserted, and a
+            # retry of this upload resumes after its last committed batch.
+            # A fresh parse goes to the store chunk by chunk, so only the
+            # categorized rows the session needs are kept in memory.
+            cache = parsed_writer("transactions", digest, key) if save_chunks else nullcontext()
+            with get_storage().ingest_job(current_user, digest) as job, cache as writer:
+
+                frames = []
+                progress = st.empty()
+
+                for chunk in chunks:
+                    if writer is not None:
+                        writer.write(chunk)
+                    chunk = fill_categories(chunk)
+                    frames.append(chunk)
+
+                    job.ingest(
+                        chunk,
+                        progress_callback=lambda done, _total, base=job.summary["inserted"]: progress.caption(
+                            f"📥 Inserted {base + done:,} rows…"
+                        ),
+                    )
+
+                job.finish()
+            summary = job.summary
+            inserted, seconds = summary["inserted"], summary["seconds"]
+            progress.empty()
 
             # ---- STORE IN SESSION STATE ----
+            df = mark_normalized(pd.concat(frames, ignore_index=True))
+            del frames
             st.session_state["df"] = df
+            gc_store()
 
             st.markdown(
                 f"<div class='custom-alert-success'>✅ Loaded "
@@ -93,41 +118,33 @@ def show():
                 unsafe_allow_html=True
             )
 
-            # ---- INSERT INTO DATABASE ----
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            records = [
-                (
-                    current_user,
-                    row["date"],
-                    row.get("category", "uncategorized"),
-                    row["description"],
-                    float(row["amount"]),
-                )
-                for _, row in df.iterrows()
-            ]
-
-            cursor.executemany(
-                """
-                INSERT INTO transactions
-                (username, date, category, description, amount)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                records,
-            )
-
-            conn.commit()
-            inserted = cursor.rowcount
-            conn.close()
-
             st.markdown(
                 f"<div class='custom-alert-info'>📥 Stored "
                 f"<b>{inserted}</b> transactions for "
-                f"<b>{current_user}</b>.</div>",
+                f"<b>{current_user}</b> "
+                f"({inserted / seconds if seconds else 0:,.0f} rows/sec).</div>",
                 unsafe_allow_html=True
             )
 
+            if reports:
+                st.markdown("#### 📄 Per-file results")
+                st.dataframe(pd.DataFrame(reports), use_container_width=True)
+
+            if summary["resumed_from"]:
+                st.markdown(
+                    f"<div class='custom-alert-info'>🔁 Resumed after "
+                    f"<b>{summary['resumed_from']}</b> rows committed by an earlier attempt.</div>",
+                    unsafe_allow_html=True
+                )
+
+            if summary["skipped"]:
+                st.markdown(
+                    f"<div class='custom-alert-warning'>⚠️ Skipped "
+                    f"<b>{summary['skipped']}</b> transactions already stored "
+                    f"from earlier uploads.</div>",
+                    unsafe_allow_html=True
+                )
+
         except Exception as e:
             st.markdown(
                 f"<div class='custom-alert-error'>❌ Failed to parse transaction file: {e}</div>",
@@ -147,67 +164,34 @@ def show():
     )
 
     if budget_file is not None:
-        filename = f"budget_{uuid.uuid4().hex}.csv"
-        path = os.path.join("data", filename)
-
-        with open(path, "wb") as f:
-            f.write(budget_file.getbuffer())
+        _, path = save_raw(budget_file.getvalue(), "budget")
 
         df_budget = pd.read_csv(path)
         df_budget.columns = df_budget.columns.str.strip().str.lower()
 
-        if not {"category", "budget"}.issubset(df_budget.columns):
+        # Budgets without a month recur over the months of the uploaded
+        # transactions (or just the current month before any upload).
+        if "df" in st.session_state and not st.session_state["df"].empty:
+            dates = st.session_state["df"]["date"]
+            first_month, last_month = dates.min(), dates.max()
+        else:
+            first_month = last_month = pd.Timestamp.now()
+
+        try:
+            plan = expand_budget_plan(df_budget, first_month, last_month)
+        except ValueError as e:
             st.markdown(
-                "<div class='custom-alert-error'>❌ Budget CSV must contain: "
-                "<b>category</b>, <b>budget</b>.</div>",
+                f"<div class='custom-alert-error'>❌ {e} Expected columns: "
+                "<b>category</b>, <b>budget</b> (optionally <b>month</b> or "
+                "<b>start_month</b>/<b>end_month</b>), or one column per month.</div>",
                 unsafe_allow_html=True
             )
             return
 
-        # ---- NORMALIZE CATEGORY ----
-        df_budget["category"] = (
-            df_budget["category"]
-            .astype(str)
-            .str.strip()
-            .str.lower()
-        )
-
-        st.session_state["budget_df"] = df_budget
+        st.session_state["budget_df"] = plan.rename(columns={"budget_amount": "budget"})
 
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            current_month = (
-                st.session_state["df"]["date"]
-                .dt.strftime("%Y-%m")
-                .mode()[0]
-            )
-
-            records = [
-                (
-                    current_user,
-                    current_month,
-                    row["category"],
-                    float(row["budget"]),
-                )
-                for _, row in df_budget.iterrows()
-            ]
-
-            cursor.executemany(
-                """
-                INSERT INTO budgets
-                (username, month, category, budget_amount)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    budget_amount = VALUES(budget_amount)
-                """,
-                records,
-            )
-
-            conn.commit()
-            affected = cursor.rowcount
-            conn.close()
+            affected = get_storage().set_budgets(current_user, plan_records(plan))
 
             st.markdown(
                 f"<div class='custom-alert-success'>✅ "
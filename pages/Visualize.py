@@ -3,6 +3,7 @@ import pandas as pd
 import altair as alt
 
 from utils.chart_utils import display_budget_vs_actual
+from scripts.normalize import is_normalized
 
 CHART_HEIGHT = 420
 
@@ -27,7 +28,8 @@ def show():
         st.stop()
 
     # ==================== PREP DATA ====================
-    df["date"] = pd.to_datetime(df["date"])
+    if not is_normalized(df):
+        df["date"] = pd.to_datetime(df["date"])
     df["month"] = df["date"].dt.to_period("M").astype(str)
 
     df["category"] = (
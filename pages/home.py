@@ -9,7 +9,7 @@ def show():
     st.markdown("""
     This app helps you track, categorize, and visualize your expenses with smart analytics.  
     You can:
-    - Upload your bank statements (CSV  ONLY)
+    - Upload your bank statements (CSV  ONLY, several at once)
     - Auto-categorize expenses
     - Visualize spending trends
     - Compare against your budget
@@ -26,7 +26,7 @@ def show():
     - `amount` → Spent or received amount  
     - `description` → Transaction details  
     - `category` → Transaction category  
-      *(If missing, it will be auto-filled as `uncategorized`)*  
+      *(If missing, it is auto-filled from the description using the category rules)*  
     
     Column names **do not need to match exactly** — the app automatically detects common variants
     (e.g. `transaction_date`, `debit/credit`, `narration`, etc.).
@@ -34,11 +34,19 @@ def show():
     ---
     
     #### 📊 Budget CSV
-    Your budget file must contain **exactly** these columns:
+    Your budget file must contain these columns:
     
     - `category` → Expense category  
     - `budget` → Monthly budget amount for that category  
     
+    Optional columns:
+    
+    - `month` → Apply the budget to that month only (`YYYY-MM`)  
+    - `start_month` / `end_month` → Repeat the budget every month in that range  
+    
+    Without them, each budget repeats over the months of your uploaded transactions.  
+    A file can instead have one `YYYY-MM` column per month next to `category`.
+    
     
     ⚠️ **Important:**  
     Category names in the budget file must match transaction categories  
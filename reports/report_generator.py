@@ -60,7 +60,8 @@ def generate_pdf_report(
     budget_df: pd.DataFrame = None,
     mae=None,
     rmse=None,
-    r2=None
+    r2=None,
+    forecast_df: pd.DataFrame = None,
 ) -> str:
 
     chart_paths = chart_paths or []
@@ -156,6 +157,10 @@ def generate_pdf_report(
             .reset_index()
         )
 
+        # Multi-month budget plans carry a month column.
+        if "month" in budget_df.columns:
+            budget_df = budget_df[budget_df["month"] == selected_month].drop(columns="month")
+
         merged = pd.merge(
             actual_df,
             budget_df,
@@ -196,6 +201,16 @@ def generate_pdf_report(
                     "Great job! You stayed within your budget across all categories."
                 )
 
+    # -------------------- FORECAST --------------------
+    if forecast_df is not None and not forecast_df.empty:
+        pdf.add_heading("Spending Forecast")
+        for category, rows in forecast_df.sort_values(["category", "horizon"]).groupby("category", sort=True):
+            steps = ", ".join(
+                f"{month}: Rs.{prediction:,.2f}"
+                for month, prediction in zip(rows["month"], rows["prediction"])
+            )
+            pdf.add_text(f"- {category}: {steps}")
+
     # -------------------- SAVE FILE --------------------
     os.makedirs("data", exist_ok=True)
     filename = f"report_{selected_month.replace('-', '')}.pdf"
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from scripts.csv_parser import parse_csv, resolve_layout
+from scripts.normalize import mark_normalized
+from utils.category_mapper import fill_categories
+from utils.ingest import RowFingerprinter
+from utils.upload_store import load_parsed, parsed_key, save_parsed
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", os.cpu_count() or 1))
+# Workers start from a fresh interpreter: forking the Streamlit server
+# would copy its threads' held locks and open database connections.
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _parse_worker(item) -> dict:
+    """Parse, cache and categorize one stored upload; never raises."""
+    name, path, digest, layout = item
+    started = time.perf_counter()
+    try:
+        layout = layout or resolve_layout(path)
+        df = parse_csv(path, layout)
+        save_parsed("transactions", digest, parsed_key(layout), df)
+        df = fill_categories(df)
+        error = None
+    except Exception as e:
+        df, error = None, str(e)
+    return {
+        "file": name,
+        "df": df,
+        "rows": 0 if df is None else len(df),
+        "seconds": time.perf_counter() - started,
+        "cached": False,
+        "error": error,
+    }
+
+
+def parse_files(items, max_workers: int = PARSE_WORKERS) -> list:
+    """
+    Parse several stored uploads in a process pool.
+
+    `items` are (display_name, path, digest, layout) tuples; a None layout
+    is resolved in the worker. Returns one result per item, in input
+    order: {"file", "df", "rows", "seconds", "cached", "error"}. A failing
+    file does not stop the others.
+    """
+    items = list(items)
+    workers = max(1, min(max_workers, len(items)))
+    if workers == 1:
+        return [_parse_worker(item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+        return list(pool.map(_parse_worker, items))
+
+
+def merge_frames(frames) -> pd.DataFrame:
+    """
+    Merge parsed statements into one canonical frame sorted by date.
+
+    Rows are fingerprinted per file, so a transaction present in two
+    overlapping statements is kept once while genuine repeats inside a
+    single statement are all kept.
+    """
+    fingerprinted = []
+    for df in frames:
+        df = df.copy()
+        df["_fingerprint"] = RowFingerprinter()(df)
+        fingerprinted.append(df)
+
+    merged = pd.concat(fingerprinted, ignore_index=True)
+    merged = (
+        merged.drop_duplicates(subset="_fingerprint")
+        .drop(columns="_fingerprint")
+        .sort_values("date", kind="stable")
+        .reset_index(drop=True)
+    )
+    return mark_normalized(merged)
+
+
+def parse_statements(items, max_workers: int = PARSE_WORKERS):
+    """
+    Load several stored uploads into one merged, deduplicated frame.
+
+    Files already in the upload store are read from their Parquet copy;
+    the rest are parsed in parallel. Returns (merged_df, reports) where
+    each report is {"file", "rows", "seconds", "cached", "error"}.
+    """
+    results, pending = [], []
+    for name, path, digest in items:
+        started = time.perf_counter()
+        try:
+            layout = resolve_layout(path)
+            cached = load_parsed("transactions", digest, parsed_key(layout))
+        except Exception:
+            # Let the worker hit the error again and report it per file.
+            layout, cached = None, None
+        if cached is None:
+            pending.append((name, path, digest, layout))
+            results.append(None)
+            continue
+        results.append({
+            "file": name,
+            "df": fill_categories(cached),
+            "rows": len(cached),
+            "seconds": time.perf_counter() - started,
+            "cached": True,
+            "error": None,
+        })
+
+    parsed = iter(parse_files(pending, max_workers))
+    results = [r if r is not None else next(parsed) for r in results]
+
+    frames = [r["df"] for r in results if r["df"] is not None]
+    merged = merge_frames(frames) if frames else None
+    reports = [{k: v for k, v in r.items() if k != "df"} for r in results]
+    return merged, reports
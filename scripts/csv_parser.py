@@ -1,6 +1,20 @@
 import pandas as pd
 import difflib
 
+from scripts.normalize import (
+    DATE_FORMATS, DATE_INFERENCE_VERSION, clean_amounts, date_format_hits, date_sample, mark_normalized,
+    parse_dates, pick_date_format,
+)
+from utils.format_registry import get_format, register_format
+
+CHUNK_SIZE = 100_000
+# Part of every parsed-upload cache key; bump it whenever parsing or
+# normalization changes what a file parses to.
+PARSER_VERSION = 2
+
+DATE_COLUMNS = ["date", "transaction_date", "txn_date", "timestamp", "value_date"]
+DESCRIPTION_COLUMNS = ["description", "narration", "details", "remarks", "transaction_details"]
+
 
 def match_column(possible_names, df_columns, cutoff=0.6):
     for name in possible_names:
@@ -12,66 +26,142 @@ def match_column(possible_names, df_columns, cutoff=0.6):
     return None
 
 
-def parse_csv(file_path: str) -> pd.DataFrame:
-    try:
-        df = pd.read_csv(file_path).copy()
+def normalize_column_name(name) -> str:
+    return str(name).strip().lower().replace(" ", "_")
 
-        # ---------------- NORMALIZE COLUMNS ----------------
-        df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-        columns = df.columns.tolist()
 
-        # ---------------- DATE ----------------
-        date_col = match_column(
-            ["date", "transaction_date", "txn_date", "timestamp", "value_date"],
-            columns,
-        )
-        if not date_col:
-            raise ValueError("❌ Could not detect a date column.")
+def detect_columns(header) -> dict:
+    """Map the canonical fields to raw header names by fuzzy matching."""
+    normalized = {}
+    for raw in header:
+        normalized.setdefault(normalize_column_name(raw), raw)
+    columns = list(normalized)
 
-        df["date"] = pd.to_datetime(df[date_col], errors="coerce")
+    # ---------------- DATE ----------------
+    date_col = match_column(DATE_COLUMNS, columns)
+    if not date_col:
+        raise ValueError("❌ Could not detect a date column.")
 
-        # ---------------- AMOUNT ----------------
-        if "amount" not in df.columns:
-            raise ValueError("CSV must contain an 'amount' column")
+    # ---------------- AMOUNT ----------------
+    if "amount" not in normalized:
+        raise ValueError("CSV must contain an 'amount' column")
+
+    # ---------------- DESCRIPTION ----------------
+    desc_col = match_column(DESCRIPTION_COLUMNS, columns)
+
+    return {
+        "date": normalized[date_col],
+        "amount": normalized["amount"],
+        "description": normalized[desc_col] if desc_col else None,
+        "category": normalized.get("category"),
+    }
+
+
+def resolve_format(header):
+    """
+    Return (columns, options) for a header row.
 
-        df["amount"] = (
-            df["amount"]
-            .astype(str)
-            .str.replace(",", "", regex=False)
-            .str.replace("₹", "", regex=False)
-            .str.strip()
-        )
+    Known layouts come straight from the format registry; new ones are
+    detected once and registered so the next upload skips fuzzy matching.
+    """
+    known = get_format(header)
+    if known:
+        return known["columns"], known.get("options", {})
 
-        df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+    columns = detect_columns(header)
+    register_format(header, columns)
+    return columns, {}
 
-        # ---------------- DESCRIPTION ----------------
-        desc_col = match_column(
-            ["description", "narration", "details", "remarks", "transaction_details"],
-            columns,
-        )
 
-        df["description"] = (
-            df[desc_col].astype(str) if desc_col else "no description"
-        )
+def normalize_frame(raw: pd.DataFrame, mapping: dict, options: dict = None) -> pd.DataFrame:
+    """Build the canonical date/amount/description/category frame from raw rows."""
+    options = options or {}
+    df = pd.DataFrame(index=raw.index)
 
-        # ---------------- CATEGORY ----------------
-        if "category" not in df.columns:
-            df["category"] = "uncategorized"
+    df["date"] = parse_dates(raw[mapping["date"]], options.get("date_format"))
+    df["amount"] = clean_amounts(raw[mapping["amount"]])
+
+    desc_col = mapping["description"]
+    df["description"] = raw[desc_col].astype(str) if desc_col else "no description"
+
+    cat_col = mapping["category"]
+    df["category"] = (
+        raw[cat_col].astype(str).str.strip().str.lower()
+        if cat_col
+        else "uncategorized"
+    )
+
+    return mark_normalized(df.dropna(subset=["date", "amount"]))
 
-        df["category"] = (
-            df["category"]
-            .astype(str)
-            .str.strip()
-            .str.lower()
-        )
 
-        # ---------------- CLEAN ----------------
-        df = df.dropna(subset=["date", "amount"]).reset_index(drop=True)
+def scan_date_format(file_path: str, date_col: str, chunksize: int = CHUNK_SIZE):
+    """
+    Infer the date format from the distinct dates of every chunk.
 
-        if df.empty:
-            raise ValueError("❌ No valid rows after parsing.")
+    Only the date column is read, so a first chunk of ambiguous dates
+    (nothing past the 12th) cannot settle the order on its own.
+    """
+    hits, total = dict.fromkeys(DATE_FORMATS, 0), 0
+    for raw in pd.read_csv(file_path, usecols=[date_col], dtype=str, chunksize=chunksize):
+        sample = date_sample(raw[date_col], chunksize)
+        for fmt, count in date_format_hits(sample).items():
+            hits[fmt] += count
+        total += len(sample)
+    return pick_date_format(hits, total)
 
-        return df
+
+def resolve_layout(file_path: str, chunksize: int = CHUNK_SIZE) -> dict:
+    """
+    Everything that decides how a file parses: the parser version, the
+    column mapping and the options (date format) for its header.
+    """
+    header = pd.read_csv(file_path, nrows=0).columns.tolist()
+    mapping, options = resolve_format(header)
+
+    # A layout remembers its date format once one is unambiguous; until
+    # then every upload re-infers, and nothing is saved.
+    if not options.get("date_format") or options.get("date_inference") != DATE_INFERENCE_VERSION:
+        date_format = scan_date_format(file_path, mapping["date"], chunksize)
+        options = {k: v for k, v in options.items() if k not in ("date_format", "date_inference")}
+        if date_format:
+            options.update(date_format=date_format, date_inference=DATE_INFERENCE_VERSION)
+            register_format(header, mapping, options)
+
+    return {"parser": PARSER_VERSION, "columns": mapping, "options": options}
+
+
+def iter_csv_chunks(file_path: str, chunksize: int = CHUNK_SIZE, layout: dict = None):
+    """
+    Stream a CSV as normalized DataFrames of at most `chunksize` rows.
+
+    Only the mapped columns are read, so peak memory is bounded by the
+    chunk size rather than the file size.
+    """
+    layout = layout or resolve_layout(file_path, chunksize)
+    mapping, options = layout["columns"], layout["options"]
+    usecols = list({c for c in mapping.values() if c})
+
+    rows = 0
+    for raw in pd.read_csv(file_path, usecols=usecols, chunksize=chunksize):
+        chunk = normalize_frame(raw, mapping, options)
+        if chunk.empty:
+            continue
+        rows += len(chunk)
+        yield chunk.reset_index(drop=True)
+
+    if rows == 0:
+        raise ValueError("❌ No valid rows after parsing.")
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunksize: int = CHUNK_SIZE):
+    """Yield an already-normalized frame in `chunksize` row slices."""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def parse_csv(file_path: str, layout: dict = None) -> pd.DataFrame:
+    try:
+        return mark_normalized(pd.concat(iter_csv_chunks(file_path, layout=layout), ignore_index=True))
 
     except Exception as e:
-        raise Exception(f"CSV parsing failed: {e}")
\ No newline at end of file
+        raise Exception(f"CSV parsing failed: {e}")
@@ -0,0 +1,131 @@
+import re
+
+import pandas as pd
+
+# Candidate layouts for a statement's date column. A layout is only
+# adopted when it is the sole candidate that parses the sample, so a
+# day-first and a month-first reading of the same dates never compete.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%d.%m.%Y",
+    "%d-%m-%y",
+    "%d/%m/%y",
+    "%d-%b-%Y",
+    "%d %b %Y",
+    "%d-%b-%y",
+    "%d %b %y",
+    "%b %d, %Y",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%m-%d-%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%d-%m-%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+]
+DATE_SAMPLE_SIZE = 1000
+DATE_MIN_MATCH = 0.9
+# Bumped when inference changes, so layouts saved by an older rule re-infer.
+DATE_INFERENCE_VERSION = 2
+
+AMOUNT_PATTERN = re.compile(
+    r"^\s*(?P<open>\()?\s*(?P<sign>[-+])?\s*(?:₹|rs\.?|inr)?\s*"
+    r"(?P<number>\d[\d,]*(?:\.\d+)?|\.\d+)\s*\)?\s*(?P<drcr>dr|cr)?\.?\s*$",
+    re.IGNORECASE,
+)
+
+
+# ---------------------- DATES ----------------------
+def date_sample(values: pd.Series, sample_size: int = DATE_SAMPLE_SIZE) -> pd.Series:
+    """Up to `sample_size` distinct non-empty date strings."""
+    sample = pd.Series(values.dropna().astype(str).str.strip().unique())
+    return sample[sample != ""].head(sample_size)
+
+
+def date_format_hits(sample: pd.Series) -> dict:
+    """How many values of `sample` each format in DATE_FORMATS parses."""
+    return {
+        fmt: int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        for fmt in DATE_FORMATS
+    }
+
+
+def pick_date_format(hits: dict, total: int):
+    """
+    The format that parses the most of `total` values, or None.
+
+    When another format parses just as many (01/02/2024 read day- or
+    month-first) the dates are ambiguous and nothing is picked.
+    """
+    best = max(hits.values(), default=0)
+    if total == 0 or best < DATE_MIN_MATCH * total:
+        return None
+    matches = [fmt for fmt, count in hits.items() if count == best]
+    return matches[0] if len(matches) == 1 else None
+
+
+def infer_date_format(values: pd.Series, sample_size: int = DATE_SAMPLE_SIZE):
+    """Return the only format in DATE_FORMATS that parses the sample, or None."""
+    sample = date_sample(values, sample_size)
+    return pick_date_format(date_format_hits(sample), len(sample))
+
+
+def parse_dates(values: pd.Series, date_format: str = None) -> pd.Series:
+    """
+    Parse a date column with a fixed format; values it cannot parse become NaT.
+
+    Without a format, pandas infers one from the first value (day-first
+    when ambiguous) and applies it to the whole column.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if not date_format:
+        return pd.to_datetime(values, dayfirst=True, errors="coerce")
+    return pd.to_datetime(values, format=date_format, errors="coerce")
+
+
+# ---------------------- AMOUNTS ----------------------
+def clean_amounts(values: pd.Series) -> pd.Series:
+    """
+    Convert raw amounts to floats.
+
+    Plain and comma-grouped numbers go straight through pd.to_numeric; only
+    the leftovers are run through AMOUNT_PATTERN, which handles currency markers, any comma
+    grouping (including lakh style 1,23,456.00), Dr/Cr suffixes and
+    parenthesized negatives. Cr and parentheses mean money in, so they
+    flip the sign.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+
+    amounts = pd.to_numeric(
+        values.astype(str).str.replace(",", "", regex=False),
+        errors="coerce",
+    ).astype(float)
+    leftover = amounts.isna() & values.notna()
+    if not leftover.any():
+        return amounts
+
+    parts = values[leftover].astype(str).str.extract(AMOUNT_PATTERN)
+    number = pd.to_numeric(parts["number"].str.replace(",", "", regex=False), errors="coerce")
+    negative = (
+        parts["open"].notna()
+        ^ parts["sign"].eq("-")
+        ^ parts["drcr"].str.lower().eq("cr")
+    )
+    amounts[leftover] = number.where(~negative, -number)
+    return amounts
+
+
+# ---------------------- MARKER ----------------------
+def mark_normalized(df: pd.DataFrame) -> pd.DataFrame:
+    """Flag a frame whose date/amount columns are already parsed."""
+    df.attrs["normalized"] = True
+    return df
+
+
+def is_normalized(df: pd.DataFrame) -> bool:
+    return bool(df.attrs.get("normalized", False))
@@ -0,0 +1,35 @@
+import duckdb
+import pandas as pd
+import pytest
+
+from utils.budget_plan import expand_budget_plan
+from utils.migrations import migrate
+
+
+def test_non_numeric_budget_names_the_bad_rows():
+    plan = pd.DataFrame({"category": ["Food", "Rent"], "budget": ["100", "abc"], "month": ["2024-01", "2024-01"]})
+    with pytest.raises(ValueError, match="Rent 2024-01: 'abc'"):
+        expand_budget_plan(plan, "2024-01")
+
+
+def test_numeric_strings_and_blank_cells_are_accepted():
+    plan = pd.DataFrame({"category": ["Food", "Rent"], "2024-01": [" 12 ", None], "2024-02": [5, 7]})
+    expanded = expand_budget_plan(plan, "2024-01")
+    assert expanded.values.tolist() == [
+        ["2024-01", "food", 12.0], ["2024-02", "food", 5.0], ["2024-02", "rent", 7.0],
+    ]
+
+
+@pytest.mark.parametrize("owner, kept", [("user_id INTEGER", []), ("username VARCHAR", [("1", "2024-01", "food", 20.0)])])
+def test_legacy_budgets_table_is_rekeyed(owner, kept):
+    conn = duckdb.connect()
+    conn.execute(f"CREATE TABLE budgets ({owner}, month VARCHAR, category VARCHAR, budget_amount DOUBLE)")
+    conn.execute("INSERT INTO budgets VALUES (1, '2024-01', 'food', 10), (1, '2024-01', 'food', 20)")
+    migrate(conn, "embedded")
+
+    assert conn.execute("SELECT * FROM budgets").fetchall() == kept
+    assert conn.execute("SELECT count(*) FROM budgets_legacy").fetchone() == (2,)
+    conn.execute(
+        "INSERT INTO budgets VALUES ('a', '2024-01', 'food', 1) "
+        "ON CONFLICT (username, month, category) DO UPDATE SET budget_amount = excluded.budget_amount"
+    )
@@ -0,0 +1,38 @@
+import re
+
+import pandas as pd
+import pytest
+
+from utils.category_mapper import CategorizationEngine, CategoryCache
+
+RULES = {"food": ["(swiggy|zomato)"], "shopping": ["amazon"], "travel": ["uber"]}
+
+
+def keyword_loop(rules, text):
+    """The original keyword-by-keyword categorization."""
+    for category, keywords in rules.items():
+        if any(re.search(k, text) for k in keywords):
+            return category
+    return "others"
+
+
+TEXTS = ["amazon", "swiggy", "zomato order", "uber trip", "amazon uber", "rent", ""]
+
+
+def test_capture_groups_inside_keywords_do_not_shift_categories():
+    engine = CategorizationEngine(RULES)
+    assert engine.match_many(["amazon", "swiggy"]) == ["shopping", "food"]
+    assert engine.match_many(TEXTS) == [keyword_loop(RULES, t) for t in TEXTS]
+
+
+@pytest.mark.parametrize("rules", [
+    {"food": ["(?i)swiggy"], "shopping": ["amazon"]},
+    {"food": ["swiggy"], "shopping": ["(?s)amaz.n"], "travel": ["(u)(b)(e)(r)"]},
+])
+def test_keywords_that_cannot_be_combined_fall_back_to_the_loop(rules):
+    engine = CategorizationEngine(rules)
+    texts = ["swiggy", "amazon", "uber", "nothing"]
+    expected = [keyword_loop(rules, t) for t in texts]
+    assert engine.match_many(texts) == expected
+    assert [engine.match(t) for t in texts] == expected
+    assert engine.categorize_series(pd.Series(texts), CategoryCache()).tolist() == expected
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from models import model_registry
+from models.spending_predictor import fit_ridge_batch, to_periods
+from tests.test_spending_predictor import monthly_history
+
+
+@pytest.fixture(autouse=True)
+def registry_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "REGISTRY_DIR", str(tmp_path))
+
+
+def assert_same_fit(actual: pd.DataFrame, expected: pd.DataFrame):
+    actual = actual.sort_values("category").reset_index(drop=True)
+    expected = expected.sort_values("category").reset_index(drop=True)
+    assert actual["category"].tolist() == expected["category"].tolist()
+    assert actual["n_train"].astype(int).tolist() == expected["n_train"].astype(int).tolist()
+    for column in ["coef_lag_1", "coef_roll_3", "intercept", "mae", "rmse"]:
+        np.testing.assert_allclose(
+            actual[column].astype(float), expected[column].astype(float), rtol=1e-6, atol=1e-6,
+        )
+
+
+def test_incremental_training_matches_batch_fit():
+    history = monthly_history()
+    history["month"] = to_periods(history["month"])
+    months = sorted(history["month"].unique())
+
+    # Grow the history a few months at a time; every step reloads the
+    # statistics saved by the previous one.
+    for through in months[5::4] + [months[-1]]:
+        seen = history[history["month"] <= through]
+        fitted = model_registry.train_incremental("alice", seen)
+        assert_same_fit(fitted, fit_ridge_batch(seen))
+
+
+def test_statistics_round_trip_through_parquet():
+    history = monthly_history(n_months=12)
+    model_registry.train_incremental("alice", history)
+    path = model_registry.statistics_path("alice")
+    assert path.endswith(".parquet")
+
+    state = model_registry.load_statistics("alice")
+    assert state["through_month"] == pd.Period("2021-12", freq="M")
+    assert state["fingerprint"] == model_registry.data_fingerprint(
+        history.assign(month=to_periods(history["month"]))
+    )
+    for name in model_registry.STATE_FRAMES:
+        assert "_frame" not in state[name].columns
+
+
+def test_changed_history_rebuilds_statistics():
+    history = monthly_history()
+    model_registry.train_incremental("alice", history[history["month"] < pd.Period("2022-06", freq="M")])
+    revised = history.copy()
+    revised.loc[0, "total_spend"] += 100.0
+    assert_same_fit(model_registry.train_incremental("alice", revised), fit_ridge_batch(revised))
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+
+from models.spending_predictor import (
+    FEATURES, MIN_TRAIN_ROWS, RIDGE_ALPHA, TRAIN_FRACTION, fit_ridge_batch, series_features, to_periods,
+)
+
+
+def monthly_history(n_categories=6, n_months=30, seed=0) -> pd.DataFrame:
+    """Random monthly spend with series of different lengths and start months."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(n_categories):
+        months = pd.period_range("2021-01", periods=n_months, freq="M")[i:]
+        frames.append(pd.DataFrame({
+            "month": months,
+            "category": f"cat{i}",
+            "total_spend": rng.gamma(2.0, 150.0, len(months)).round(2),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_batch_fit_matches_per_series_sklearn_ridge():
+    history = monthly_history()
+    history["month"] = to_periods(history["month"])
+    fitted = fit_ridge_batch(history).set_index("category")
+
+    featured, _, _ = series_features(history, ["category"])
+    featured = featured.dropna(subset=[*FEATURES, "total_spend"])
+    checked = 0
+    for category, series in featured.groupby("category"):
+        if len(series) < MIN_TRAIN_ROWS:
+            assert category not in fitted.index
+            continue
+        split = max(1, int(len(series) * TRAIN_FRACTION))
+        train, test = series.iloc[:split], series.iloc[split:]
+        model = Ridge(alpha=RIDGE_ALPHA).fit(train[FEATURES], train["total_spend"])
+        error = test["total_spend"] - model.predict(test[FEATURES])
+
+        row = fitted.loc[category]
+        np.testing.assert_allclose(row[["coef_lag_1", "coef_roll_3"]].astype(float), model.coef_, rtol=1e-6, atol=1e-6)
+        assert row["intercept"] == pytest.approx(model.intercept_, rel=1e-6, abs=1e-6)
+        assert row["n_train"] == split
+        assert row["mae"] == pytest.approx(error.abs().mean(), rel=1e-6, abs=1e-6)
+        assert row["rmse"] == pytest.approx(np.sqrt((error ** 2).mean()), rel=1e-6, abs=1e-6)
+        checked += 1
+    assert checked == len(fitted)
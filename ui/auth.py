@@ -1,7 +1,7 @@
 import streamlit as st
 import string
 import re
-from utils.auth_db import create_user, validate_login 
+from utils.auth_db import create_user, login
 
 def is_valid_email(email):
     return re.match(r"[^@]+@[^@]+\.[^@]+", email)
@@ -26,12 +26,7 @@ def auth_ui():
         password = st.text_input("Password", type="password")
 
         if st.button("Login"):
-            is_valid, name, role = validate_login(username, password)
-            if is_valid:
-                st.session_state["logged_in"] = True
-                st.session_state["user"] = username
-                st.session_state["name"] = name
-                st.session_state["role"] = role
+            if login(username, password):
                 st.rerun()
             else:
                 st.error("❌ Invalid username or password.")
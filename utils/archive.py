@@ -0,0 +1,227 @@
+import os
+import re
+import sys
+import uuid
+
+import pandas as pd
+
+from utils.file_lock import file_lock
+from utils.rollup import DEFAULT_CATEGORY, ROLLUP_KEY, ROLLUP_TABLE_COLUMNS, amount_aggregates
+
+# Whole months older than ARCHIVE_AFTER_MONTHS move out of the hot
+# `transactions` table into one zstd-compressed Parquet file per month,
+# sorted by (username, date) so per-user reads skip most row groups.
+ARCHIVE_DIR = os.path.join("data", "archive")
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 12))
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_ROW_GROUP_SIZE = 50_000
+
+_ARCHIVE_FILE = re.compile(r"^transactions_(\d{4}-\d{2})\.parquet$")
+
+
+# ---------------------- LAYOUT ----------------------
+def archive_path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"transactions_{month}.parquet")
+
+
+def _month_lock(month: str):
+    # Archival (nightly job) and deletes (app) both rewrite month files.
+    return file_lock(os.path.join(ARCHIVE_DIR, f"transactions_{month}.lock"))
+
+
+def archived_months() -> list:
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        m.group(1) for m in map(_ARCHIVE_FILE.match, os.listdir(ARCHIVE_DIR)) if m
+    )
+
+
+def cutoff_month(keep_months: int = ARCHIVE_AFTER_MONTHS, today=None) -> str:
+    """First month that stays hot; every earlier month is archivable."""
+    current = pd.Timestamp(today or pd.Timestamp.now()).to_period("M")
+    return str(current - keep_months)
+
+
+def month_bounds(month: str):
+    """[start, end) timestamps of a 'YYYY-MM' month."""
+    period = pd.Period(month, freq="M")
+    return period.start_time, (period + 1).start_time
+
+
+def prune_months(months, start_date=None, end_date=None) -> list:
+    """Archived months that can hold rows dated within [start_date, end_date]."""
+    if not (start_date and end_date):
+        return list(months)
+    first = str(pd.Timestamp(start_date).to_period("M"))
+    last = str(pd.Timestamp(end_date).to_period("M"))
+    return [m for m in months if first <= m <= last]
+
+
+# ---------------------- READS ----------------------
+def read_archive(username=None, start_date=None, end_date=None, category=None) -> pd.DataFrame:
+    """
+    Archived transactions matching the same filters as the hot reads.
+
+    Month files outside the date range are never opened; inside a file,
+    the username filter is pushed down to Parquet row-group statistics.
+    """
+    filters = [("username", "==", username)] if username is not None else None
+    frames = []
+    for month in prune_months(archived_months(), start_date, end_date):
+        df = pd.read_parquet(archive_path(month), filters=filters)
+        if start_date and end_date:
+            df = df[df["date"].between(pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        if category:
+            df = df[df["category"] == category]
+        if not df.empty:
+            frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def union_frames(hot: pd.DataFrame, archived: pd.DataFrame) -> pd.DataFrame:
+    """Hot and archived rows as one frame ordered by (date, id), each id once."""
+    if archived.empty:
+        return hot
+    if hot.empty:
+        merged = archived
+    else:
+        merged = pd.concat([archived[hot.columns], hot], ignore_index=True)
+    return (
+        merged.drop_duplicates(subset="id", keep="last")
+        .sort_values(["date", "id"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def archive_rollup(username=None, month=None, category=None) -> pd.DataFrame:
+    """
+    Rollup rows for the archived transactions, shaped like
+    monthly_category_totals; `month` and `category` narrow it to one group.
+    """
+    filters = [("username", "==", username)] if username is not None else None
+    months = archived_months()
+    if month is not None:
+        months = [m for m in months if m == month]
+    parts = []
+    for month in months:
+        df = pd.read_parquet(
+            archive_path(month), columns=["username", "category", "amount"], filters=filters
+        )
+        if category is not None:
+            df = df[df["category"].astype(object).fillna(DEFAULT_CATEGORY) == category]
+        if df.empty:
+            continue
+        parts.append(amount_aggregates(
+            pd.DataFrame({
+                "username": df["username"].astype(object),
+                "month": month,
+                "category": df["category"].astype(object).fillna(DEFAULT_CATEGORY),
+                "amount": df["amount"].astype(float),
+            }),
+            ROLLUP_KEY,
+        ))
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_TABLE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[list(ROLLUP_TABLE_COLUMNS)]
+
+
+# ---------------------- ARCHIVAL ----------------------
+def write_archive(month: str, frame: pd.DataFrame) -> int:
+    """
+    Merge `frame` into the month's archive file; returns its size in bytes.
+
+    Rows already archived under the same id are replaced, so re-running a
+    month after an interrupted archival never duplicates anything.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(month)
+    with _month_lock(month):
+        if os.path.exists(path):
+            frame = pd.concat([pd.read_parquet(path), frame], ignore_index=True)
+            frame = frame.drop_duplicates(subset="id", keep="last")
+        _write_month(path, frame)
+    return os.path.getsize(path)
+
+
+def _write_month(path: str, frame: pd.DataFrame):
+    frame = frame.sort_values(["username", "date", "id"], kind="stable")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    frame.to_parquet(
+        tmp_path,
+        index=False,
+        compression=ARCHIVE_COMPRESSION,
+        row_group_size=ARCHIVE_ROW_GROUP_SIZE,
+    )
+    os.replace(tmp_path, path)
+
+
+def remove_archived(username: str, txn_id, month: str = None):
+    """
+    Delete one archived transaction by rewriting its month's file.
+
+    Looks only in `month` when given, otherwise in every archived month.
+    Returns the removed row's {"month", "category", "date"}, or None.
+    """
+    months = archived_months()
+    if month is not None:
+        months = [m for m in months if m == month]
+    for month in months:
+        path = archive_path(month)
+        ids = pd.read_parquet(path, columns=["id", "username"], filters=[("id", "==", int(txn_id))])
+        if not (ids["username"] == username).any():
+            continue
+        with _month_lock(month):
+            frame = pd.read_parquet(path)
+            hit = (frame["id"] == int(txn_id)) & (frame["username"] == username)
+            if not hit.any():
+                return None
+            row = frame[hit].iloc[0]
+            rest = frame[~hit]
+            if rest.empty:
+                os.remove(path)
+            else:
+                _write_month(path, rest)
+        category = row["category"] if pd.notna(row["category"]) else DEFAULT_CATEGORY
+        return {"month": month, "category": category, "date": row["date"]}
+    return None
+
+
+def archive_old_months(storage=None, keep_months: int = ARCHIVE_AFTER_MONTHS) -> list:
+    """
+    Move every hot month older than `keep_months` to Parquet.
+
+    Each month's file is fully written and renamed into place before its
+    rows are removed from the hot table, by exactly the ids written.
+    Returns one report per month: {"month", "rows", "bytes"}.
+    """
+    if storage is None:
+        from utils.storage import get_storage
+        storage = get_storage()
+
+    cutoff = cutoff_month(keep_months)
+    reports = []
+    for month in storage.hot_months_before(cutoff):
+        frame = storage.hot_month_frame(month)
+        if frame.empty:
+            continue
+        size = write_archive(month, frame)
+        storage.drop_hot_month(month, frame["id"].astype("int64").tolist())
+        reports.append({"month": month, "rows": len(frame), "bytes": size})
+    return reports
+
+
+if __name__ == "__main__":
+    from utils.storage import get_storage
+
+    keep = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_MONTHS
+    storage = get_storage()
+    if hasattr(storage, "ensure_partitions"):
+        created = storage.ensure_partitions()
+        if created:
+            print(f"Created partitions: {', '.join(created)}")
+    for report in archive_old_months(storage, keep):
+        print(f"Archived {report['month']}: {report['rows']} rows, {report['bytes'] / 1024:.0f} KiB")
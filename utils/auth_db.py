@@ -1,18 +1,12 @@
 import re
 import streamlit as st
-import mysql.connector
-import os
+from utils.db_pool import get_connection
+from utils.identity import build_identity, clear_identity, get_identity, set_identity
+from utils.storage import get_storage
 # ---------------------- CONNECTION ----------------------
 def get_db_connection():
-    conn = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=int(os.getenv("DB_PORT", 3306)),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        ssl_ca=os.getenv("DB_SSL_CA")
-    )
-    return conn
+    """Pooled connection; `close()` hands it back to the pool."""
+    return get_connection()
 
 # ---------------------- VALIDATORS ----------------------
 def is_valid_email(email):
@@ -26,56 +20,42 @@ def create_user(username, first_name, last_name, contact, email, password, role=
     if not is_valid_email(email) or not is_valid_contact(contact):
         return "invalid"
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Check if username or email already exists
-    cursor.execute("SELECT * FROM users WHERE username=%s OR email=%s", (username, email))
-    if cursor.fetchone():
-        conn.close()
-        return "exists"
-
-    try:
-        cursor.execute(
-            "INSERT INTO users (username, first_name, last_name, contact, email, password_, role) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            (username, first_name, last_name, contact, email, password, role)
-        )
-        conn.commit()
-        conn.close()
-        return "success"
-    except Exception as e:
-        print("Error creating user:", e)
-        conn.close()
-        return "invalid"
+    return get_storage().create_user(username, first_name, last_name, contact, email, password, role)
 
 def validate_login(username, password):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        "SELECT * FROM users WHERE username=%s AND password_=%s",
-        (username, password)
-    )
-    user = cursor.fetchone()
-    conn.close()
+    user = get_storage().get_user(username, password)
     if user:
         return True, f"{user['first_name']} {user['last_name']}", user.get("role", "user")
     return False, None, None
 
+def login(username, password):
+    """Validate credentials and cache the user's identity in the session."""
+    user = get_storage().get_user(username, password)
+    if not user:
+        return None
+    identity = build_identity(user)
+    set_identity(identity)
+    return identity
+
+def logout():
+    clear_identity()
+    st.session_state.clear()
+
 # ---------------------- SESSION HELPERS ----------------------
 def is_logged_in():
-    return st.session_state.get("logged_in", False)
+    return get_identity() is not None
+
+def get_current_username():
+    identity = get_identity()
+    return identity["username"] if identity else None
 
 def get_logged_in_user():
-    return st.session_state.get("name", "Guest")
+    identity = get_identity()
+    return identity["display_name"] if identity else "Guest"
 
 def get_user_role():
-    return st.session_state.get("role", "user")
+    identity = get_identity()
+    return identity["role"] if identity else "user"
 
 def get_all_users():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT username, first_name, last_name, email, contact, role FROM users")
-    users = cursor.fetchall()
-    conn.close()
-    return users
\ No newline at end of file
+    return get_storage().get_all_users()
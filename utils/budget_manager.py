@@ -1,39 +1,157 @@
+import csv
+import io
 import os
+import threading
+
 import pandas as pd
 import streamlit as st
 
 BUDGET_FILE = "data/budgets.csv"
+# Changes since the last compaction, one "category,budget" line each; an
+# empty budget removes the category.
+BUDGET_JOURNAL = "data/budgets.journal.csv"
+# Fold the journal into BUDGET_FILE once it outgrows this many lines.
+COMPACT_AFTER = int(os.getenv("BUDGET_COMPACT_AFTER", 500))
+
+
+def _normalize(category) -> str:
+    return str(category).strip().lower()
+
+
+class BudgetStore:
+    """
+    Fixed category budgets held in a dict keyed by normalized category.
+
+    Loaded once; every change updates the dict and appends to the journal,
+    and the journal is periodically compacted into BUDGET_FILE.
+    """
+
+    def __init__(self, path=BUDGET_FILE, journal_path=BUDGET_JOURNAL):
+        self.path = path
+        self.journal_path = journal_path
+        self._budgets = {}
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    # ---- loading ----
+    def _load(self):
+        if os.path.exists(self.path):
+            snapshot = pd.read_csv(self.path)
+            for category, budget in zip(snapshot["category"], snapshot["budget"]):
+                self._budgets[_normalize(category)] = float(budget)
+
+        torn = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    try:
+                        self._apply(row[0], float(row[1]) if row[1] else None)
+                        self._journal_lines += 1
+                    except (IndexError, ValueError):
+                        torn = True  # last line of an interrupted append
+        if torn:
+            # Rewrite before appending, or the next line would be glued to it.
+            self._compact()
+
+    def _apply(self, category, amount):
+        if amount is None:
+            self._budgets.pop(category, None)
+        else:
+            self._budgets[category] = amount
+
+    # ---- writes ----
+    def save_many(self, budgets: dict):
+        """Set several categories with a single journal append."""
+        changes = {
+            _normalize(category): (None if amount is None else float(amount))
+            for category, amount in budgets.items()
+        }
+        if not changes:
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(
+            (category, "" if amount is None else amount) for category, amount in changes.items()
+        )
+        with self._lock:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8", newline="") as f:
+                f.write(buffer.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+            for category, amount in changes.items():
+                self._apply(category, amount)
+            self._journal_lines += len(changes)
+            if self._journal_lines >= COMPACT_AFTER:
+                self._compact()
+
+    def save(self, category, amount):
+        self.save_many({category: amount})
+
+    def remove(self, category):
+        self.save_many({category: None})
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """Atomically rewrite BUDGET_FILE from memory, then empty the journal."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self._frame().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        # A crash before this truncation only replays changes the snapshot
+        # already holds.
+        open(self.journal_path, "w").close()
+        self._journal_lines = 0
+
+    # ---- reads ----
+    def get(self, category):
+        with self._lock:
+            return self._budgets.get(_normalize(category))
+
+    def to_frame(self) -> pd.DataFrame:
+        with self._lock:
+            return self._frame()
+
+    def _frame(self) -> pd.DataFrame:
+        # One items() snapshot, so categories and budgets always line up.
+        return pd.DataFrame(list(self._budgets.items()), columns=["category", "budget"])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_budget_store() -> BudgetStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BudgetStore()
+    return _store
 
 
 def save_budget(category, amount):
     """Save fixed budget for a category (ignores month)."""
-    os.makedirs("data", exist_ok=True)
-    df = load_budgets()
-
-    # Remove existing entry for category
-    df = df[df["category"] != category]
+    get_budget_store().save(category, amount)
 
-    # Add new one
-    new_row = pd.DataFrame([{"category": category, "budget": amount}])
-    df = pd.concat([df, new_row], ignore_index=True)
 
-    df.to_csv(BUDGET_FILE, index=False)
+def save_budgets(budgets: dict):
+    """Save fixed budgets for several categories at once."""
+    get_budget_store().save_many(budgets)
 
 
 def load_budgets():
-    """Load fixed category budgets from local file."""
-    if os.path.exists(BUDGET_FILE):
-        return pd.read_csv(BUDGET_FILE)
-    return pd.DataFrame(columns=["category", "budget"])
+    """Fixed category budgets as a (category, budget) frame."""
+    return get_budget_store().to_frame()
 
 
 def get_budget(category):
     """Get fixed budget amount for a given category."""
-    df = load_budgets()
-    row = df[df["category"] == category]
-    if not row.empty:
-        return row.iloc[0]["budget"]
-    return None
+    return get_budget_store().get(category)
 
 
 
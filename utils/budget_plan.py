@@ -0,0 +1,111 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# A budget plan is any of these CSV shapes (columns are case-insensitive):
+#   category, budget                          -> recurring over the default range
+#   category, budget, month                   -> that month only
+#   category, budget, start_month[, end_month] -> recurring from start_month
+#   category, 2024-01, 2024-02, ...           -> category x month matrix
+# Every shape expands to one (month, category, budget_amount) row per
+# budgeted month. A single-month entry beats a recurring rule for the same
+# month and category; among equals, the later row wins.
+PLAN_COLUMNS = ["month", "category", "budget_amount"]
+MONTH_COLUMN = re.compile(r"^\d{4}-\d{2}$")
+
+
+def to_month(value) -> str:
+    return str(pd.Period(value, freq="M"))
+
+
+def _clean(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.dropna(subset=["budget_amount"])
+    amounts = pd.to_numeric(frame["budget_amount"], errors="coerce")
+    bad = frame[amounts.isna()]
+    if not bad.empty:
+        shown = ", ".join(
+            f"{category} {month}: {amount!r}"
+            for month, category, amount in bad[PLAN_COLUMNS].head(5).itertuples(index=False)
+        )
+        more = f" and {len(bad) - 5} more" if len(bad) > 5 else ""
+        raise ValueError(f"Budget amounts must be numbers ({shown}{more}).")
+    frame = frame.assign(
+        category=frame["category"].astype(str).str.strip().str.lower(),
+        budget_amount=amounts.astype(float),
+    )
+    return frame[PLAN_COLUMNS]
+
+
+def _latest_per_month(frame: pd.DataFrame) -> pd.DataFrame:
+    return (
+        frame.drop_duplicates(subset=["month", "category"], keep="last")
+        .sort_values(["month", "category"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def _expand_recurring(rules: pd.DataFrame, default_end: str) -> pd.DataFrame:
+    """One row per month from each rule's start_month through its end_month."""
+    if rules.empty:
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+    start = pd.PeriodIndex(rules["start_month"].map(to_month), freq="M")
+    end_values = rules["end_month"] if "end_month" in rules.columns else pd.Series(None, index=rules.index)
+    end = pd.PeriodIndex(end_values.fillna(default_end).map(to_month), freq="M")
+
+    span = (end.year - start.year) * 12 + (end.month - start.month) + 1
+    span = np.clip(np.asarray(span), 0, None)
+    offsets = np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+    months = (np.repeat(start.asi8, span) + offsets).astype("int64")
+
+    return pd.DataFrame({
+        "month": pd.PeriodIndex.from_ordinals(months, freq="M").astype(str),
+        "category": np.repeat(rules["category"].to_numpy(), span),
+        "budget_amount": np.repeat(rules["budget"].to_numpy(), span),
+    })
+
+
+def expand_budget_plan(plan: pd.DataFrame, default_start: str, default_end: str = None) -> pd.DataFrame:
+    """
+    Expand an uploaded budget plan into PLAN_COLUMNS rows.
+
+    Recurring rules without an end run through `default_end` (or
+    `default_start` when that is not given either).
+    """
+    plan = plan.rename(columns=lambda c: str(c).strip().lower())
+    if "category" not in plan.columns:
+        raise ValueError("Budget plan must contain a category column.")
+    default_start = to_month(default_start)
+    default_end = to_month(default_end or default_start)
+
+    month_columns = [c for c in plan.columns if MONTH_COLUMN.match(c)]
+    if month_columns:
+        expanded = _clean(plan.melt(
+            id_vars="category", value_vars=month_columns,
+            var_name="month", value_name="budget_amount",
+        ))
+        return _latest_per_month(expanded)
+
+    if "budget" not in plan.columns:
+        raise ValueError("Budget plan must contain a budget column or YYYY-MM month columns.")
+
+    plan = plan.copy()
+    if "month" not in plan.columns:
+        plan["month"] = None
+    if "start_month" not in plan.columns:
+        plan["start_month"] = None
+
+    single = plan["month"].notna()
+    # Rows with neither a month nor a start recur over the default range.
+    plan.loc[~single & plan["start_month"].isna(), "start_month"] = default_start
+
+    recurring = _expand_recurring(plan[~single], default_end)
+    fixed = plan.loc[single, ["month", "category", "budget"]].rename(columns={"budget": "budget_amount"})
+    fixed["month"] = fixed["month"].map(to_month)
+
+    return _latest_per_month(_clean(pd.concat([recurring, fixed], ignore_index=True)))
+
+
+def plan_records(expanded: pd.DataFrame) -> list:
+    """(month, category, amount) tuples for set_budgets."""
+    return list(expanded[PLAN_COLUMNS].itertuples(index=False, name=None))
@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 import os
+from utils.category_mapper import reload_rules
 
 CATEGORY_FILE = os.path.join("config", "category_rules.json")
 
@@ -15,6 +16,7 @@ def save_category_rules(rules):
     try:
         with open(CATEGORY_FILE, "w") as f:
             json.dump(rules, f, indent=4)
+        reload_rules(rules)
         return True
     except Exception as e:
         st.error(f"❌ Failed to save: {e}")
@@ -1,8 +1,16 @@
+import hashlib
 import json
 import os
 import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
 
 CATEGORY_FILE = os.path.join("config", "category_rules.json")
+DEFAULT_CATEGORY = "others"
+UNCATEGORIZED = ["", "nan", "none", "uncategorized"]
+CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", 50000))
 
 def load_rules():
     try:
@@ -12,15 +20,213 @@ def load_rules():
         print(f"Failed to load category rules: {e}")
         return {}
 
+def rules_version(rules) -> str:
+    """Stable fingerprint of a rule set (category order matters)."""
+    return hashlib.sha1(json.dumps(rules).encode("utf-8")).hexdigest()[:12]
+
 CATEGORIZATION_RULES = load_rules()
 
-def categorize_transaction(description: str) -> str:
-    """Categorize a transaction using regex pattern match."""
-    description = str(description).lower()
+# ---------------------- CACHE ----------------------
+class CategoryCache:
+    """
+    Process-wide LRU of normalized description -> category.
+
+    The cache is stamped with the rule version it was filled under; a lookup
+    under any other version empties it first.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._data.clear()
+            self.version = version
+
+    def get_many(self, keys, version):
+        """Return {key: category} for cached keys and count hits/misses."""
+        found = {}
+        with self._lock:
+            self._check_version(version)
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                    found[key] = value
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items, version):
+        with self._lock:
+            self._check_version(version)
+            for key, value in items:
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "version": self.version,
+            }
+
+
+_CACHE = CategoryCache()
+
+# ---------------------- ENGINE ----------------------
+class CategorizationEngine:
+    """
+    Compiled form of the category rules.
+
+    Every category becomes one anchored lookahead branch of a single regex,
+    tried in rule order, so the first category with any matching keyword
+    wins exactly as in the original keyword-by-keyword loop. Keywords that
+    cannot be embedded in it (e.g. inline global flags such as `(?i)`)
+    make the engine fall back to that loop.
+    """
+
+    def __init__(self, rules, default=DEFAULT_CATEGORY):
+        self.default = default
+        self.version = rules_version(rules)
+        self.categories = []
+        # (category, [compiled keywords]) in rule order, for the fallback.
+        self.keywords = []
+        branches = []
+
+        for category, keywords in rules.items():
+            valid = []
+            for pattern in keywords:
+                try:
+                    valid.append(re.compile(pattern))
+                except re.error as e:
+                    print(f"Skipping invalid pattern {pattern!r} for {category}: {e}")
+            if not valid:
+                continue
+            group = f"c{len(self.categories)}"
+            self.categories.append(category)
+            self.keywords.append((category, valid))
+            alternatives = "|".join(f"(?:{k.pattern})" for k in valid)
+            branches.append(f"(?=[\\s\\S]*?(?:{alternatives}))(?P<{group}>)")
+
+        self.pattern = None
+        if branches:
+            try:
+                self.pattern = re.compile(f"^(?:{'|'.join(branches)})")
+            except re.error as e:
+                print(f"Category rules cannot be combined ({e}); matching keyword by keyword.")
+        # Only the per-category marker groups, not groups inside keywords.
+        self.groups = [f"c{i}" for i in range(len(self.categories))]
 
-    for category, keywords in CATEGORIZATION_RULES.items():
-        for pattern in keywords:
-            if re.search(pattern, description):  # Regex match
+    def _match_keywords(self, text: str) -> str:
+        for category, keywords in self.keywords:
+            if any(k.search(text) for k in keywords):
                 return category
+        return self.default
 
-    return 'others'
+    def match(self, text: str) -> str:
+        """Categorize one already-lowercased description, bypassing the cache."""
+        if self.pattern is None:
+            return self._match_keywords(text)
+        found = self.pattern.match(text)
+        if not found:
+            return self.default
+        return self.categories[int(found.lastgroup[1:])]
+
+    def match_many(self, texts) -> list:
+        """Categorize already-lowercased descriptions in one vectorized pass."""
+        if len(texts) == 0:
+            return []
+        if self.pattern is None:
+            return [self._match_keywords(text) for text in texts]
+
+        extracted = pd.Series(texts, dtype=object).str.extract(self.pattern)
+        labels = extracted[self.groups].notna().to_numpy()
+        return [
+            self.categories[row.argmax()] if row.any() else self.default
+            for row in labels
+        ]
+
+    def categorize(self, description, cache=None) -> str:
+        """Categorize a single description."""
+        cache = _CACHE if cache is None else cache
+        key = str(description).lower()
+        found = cache.get_many([key], self.version)
+        if key in found:
+            return found[key]
+        category = self.match(key)
+        cache.put_many([(key, category)], self.version)
+        return category
+
+    def categorize_series(self, descriptions: pd.Series, cache=None) -> pd.Series:
+        """Categorize a whole Series, matching each distinct uncached description once."""
+        cache = _CACHE if cache is None else cache
+        codes, uniques = pd.factorize(descriptions.astype(str).str.lower())
+        if len(uniques) == 0:
+            return pd.Series(self.default, index=descriptions.index, dtype=object)
+
+        keys = uniques.tolist()
+        found = cache.get_many(keys, self.version)
+        missing = [k for k in keys if k not in found]
+        if missing:
+            computed = list(zip(missing, self.match_many(missing)))
+            cache.put_many(computed, self.version)
+            found.update(computed)
+
+        categories = pd.Series([found[k] for k in keys], dtype=object).to_numpy()
+        return pd.Series(categories[codes], index=descriptions.index)
+
+
+_ENGINE = CategorizationEngine(CATEGORIZATION_RULES)
+
+def get_engine() -> CategorizationEngine:
+    return _ENGINE
+
+def reload_rules(rules=None):
+    """Rebuild the engine from `rules` (or the rules file); stale cache entries are dropped."""
+    global CATEGORIZATION_RULES, _ENGINE
+    CATEGORIZATION_RULES = load_rules() if rules is None else rules
+    _ENGINE = CategorizationEngine(CATEGORIZATION_RULES)
+    return _ENGINE
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the shared description cache."""
+    return _CACHE.stats()
+
+def clear_cache():
+    _CACHE.clear()
+
+def categorize_series(descriptions: pd.Series) -> pd.Series:
+    """Vectorized categorization of a Series of descriptions."""
+    return _ENGINE.categorize_series(descriptions)
+
+def fill_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Auto-categorize rows whose category is missing or 'uncategorized'."""
+    missing = df["category"].isin(UNCATEGORIZED)
+    if not missing.any():
+        return df
+    df = df.copy()
+    df.loc[missing, "category"] = categorize_series(df.loc[missing, "description"])
+    return df
+
+def categorize_transaction(description: str) -> str:
+    """Categorize a transaction using regex pattern match."""
+    return _ENGINE.categorize(description)
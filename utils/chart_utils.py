@@ -92,6 +92,10 @@ def generate_budget_vs_actual_chart(df, selected_month, chart_type):
     if "budget_amount" in budget_df.columns:
         budget_df = budget_df.rename(columns={"budget_amount": "budget"})
 
+    # Multi-month plans carry a month column; compare against that month only.
+    if "month" in budget_df.columns:
+        budget_df = budget_df[budget_df["month"] == selected_month].drop(columns="month")
+
     actual_df = (
         df[df["month"] == selected_month]
         .groupby("category", as_index=False)["amount"]
@@ -1,6 +1,6 @@
 import pandas as pd
 from pandas.tseries.offsets import MonthBegin
-from utils.category_mapper import categorize_transaction  # Or .py if that's where it lives
+from utils.category_mapper import categorize_series
 
 def clean_and_prepare(df):
     df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
@@ -8,7 +8,7 @@ def clean_and_prepare(df):
     df.dropna(subset=['date'], inplace=True)
 
     if 'category' not in df.columns or df['category'].isna().all() or (df['category'] == "").all():
-        df['category'] = df['description'].apply(lambda x: categorize_transaction(x) or "Uncategorized")
+        df['category'] = categorize_series(df['description']).replace("", "Uncategorized")
 
     df['month'] = df['date'].dt.to_period('M').astype(str)
     return df
@@ -0,0 +1,321 @@
+import bisect
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+METRICS_ENABLED = os.getenv("DB_METRICS", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+SLOW_QUERY_KEEP = 200
+
+# Upper bounds (ms) of the histogram buckets; the last one catches the rest.
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+PHASES = ("acquire", "execute", "fetch", "total")
+UNNAMED = "unnamed"
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+_slow = deque(maxlen=SLOW_QUERY_KEEP)
+
+
+# ---------------------- HISTOGRAMS ----------------------
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in milliseconds."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (capped at the max seen)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {str(b): n for b, n in zip(BUCKETS_MS, self.counts) if n},
+        }
+
+
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.statements = 0
+        self.rows = 0
+        self.phases = {phase: LatencyHistogram() for phase in PHASES}
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "statements": self.statements,
+            "rows": self.rows,
+            **{phase: hist.to_dict() for phase, hist in self.phases.items()},
+        }
+
+
+def _operation_stats(name: str) -> OperationStats:
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats.setdefault(name, OperationStats())
+    return stats
+
+
+def current_operation() -> str:
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else UNNAMED
+
+
+def record(phase: str, ms: float, rows: int = 0, operation: str = None):
+    """Add one timing to the current (or given) operation."""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        stats = _operation_stats(operation or current_operation())
+        stats.phases[phase].observe(ms)
+        stats.rows += rows
+        if phase == "execute":
+            stats.statements += 1
+
+
+# ---------------------- OPERATIONS ----------------------
+@contextmanager
+def operation(name: str):
+    """Attribute every DB call made inside the block to `name`."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        # Pop our own entry: a generator closed late may no longer be on top.
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i] is name:
+                del stack[i]
+                break
+        if METRICS_ENABLED:
+            with _lock:
+                stats = _operation_stats(name)
+                stats.calls += 1
+                stats.errors += failed
+                stats.phases["total"].observe((time.perf_counter() - started) * 1000)
+
+
+def instrumented(name: str):
+    """Decorator form of `operation`; generators are timed until exhausted."""
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with operation(name):
+                    yield from fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with operation(name):
+                    return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def instrument_methods(prefix: str):
+    """Class decorator: wrap every public method as operation `<prefix>.<method>`."""
+    def decorate(cls):
+        for attr, fn in inspect.getmembers(cls, inspect.isfunction):
+            if attr.startswith("_") or hasattr(fn, "__wrapped__"):
+                continue
+            setattr(cls, attr, instrumented(f"{prefix}.{attr}")(fn))
+        return cls
+    return decorate
+
+
+# ---------------------- SLOW QUERIES ----------------------
+_REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+
+
+def sql_template(sql: str) -> str:
+    """Whitespace-collapsed SQL with repeated VALUES groups folded to `(...) x N`."""
+    sql = " ".join(str(sql).split())
+    return _REPEATED_GROUP.sub(
+        lambda m: f"{m.group(1)} x{m.group(0).count(m.group(1))}", sql
+    )
+
+
+def params_shape(params, many: bool = False):
+    """Types and sizes of the bound parameters, never their values."""
+    if params is None:
+        return None
+    if many:
+        params = list(params)
+        return {"rows": len(params), "row": params_shape(params[0]) if params else None}
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    params = list(params)
+    types = [type(v).__name__ for v in params]
+    if len(types) > 12:
+        return {"count": len(types), "types": sorted(set(types))}
+    return types
+
+
+def log_slow_query(sql, params, execute_ms: float, fetch_ms: float, rows: int, many: bool = False):
+    entry = {
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "operation": current_operation(),
+        "sql": sql_template(sql),
+        "params": params_shape(params, many),
+        "execute_ms": round(execute_ms, 2),
+        "fetch_ms": round(fetch_ms, 2),
+        "rows": rows,
+    }
+    _slow.append(entry)
+    if SLOW_QUERY_LOG:
+        try:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            print(f"Could not write slow query log: {e}")
+
+
+# ---------------------- CONNECTION PROXIES ----------------------
+class InstrumentedCursor:
+    """Cursor proxy timing execute and fetch calls of the current operation."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _execute(self, method, sql, params, many):
+        started = time.perf_counter()
+        try:
+            return method(sql, params) if params is not None else method(sql)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            record("execute", ms)
+            self._statement = {"sql": sql, "params": params, "many": many,
+                               "execute_ms": ms, "fetch_ms": 0.0, "rows": 0, "logged": False}
+            self._check_slow()
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        if args or kwargs:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        return self._execute(self._cursor.execute, sql, params, False)
+
+    def executemany(self, sql, seq_params):
+        return self._execute(self._cursor.executemany, sql, seq_params, True)
+
+    def _fetch(self, method, *args, one=False):
+        started = time.perf_counter()
+        result = method(*args)
+        ms = (time.perf_counter() - started) * 1000
+        rows = (result is not None) if one else len(result)
+        record("fetch", ms, rows)
+        if self._statement:
+            self._statement["fetch_ms"] += ms
+            self._statement["rows"] += rows
+            self._check_slow()
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone, one=True)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def _check_slow(self):
+        s = self._statement
+        if s["logged"] or s["execute_ms"] + s["fetch_ms"] < SLOW_QUERY_MS:
+            return
+        s["logged"] = True
+        log_slow_query(s["sql"], s["params"], s["execute_ms"], s["fetch_ms"], s["rows"], s["many"])
+
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+
+# ---------------------- QUERYING ----------------------
+def get_metrics() -> dict:
+    """{operation: {"calls", "errors", "statements", "rows", "acquire", "execute", "fetch", "total"}}"""
+    with _lock:
+        return {name: stats.to_dict() for name, stats in _stats.items()}
+
+
+def metrics_frame() -> pd.DataFrame:
+    """One row per operation with call counts and per-phase mean/p95 latency."""
+    rows = []
+    for name, m in get_metrics().items():
+        row = {k: m[k] for k in ("calls", "errors", "statements", "rows")}
+        for phase in PHASES:
+            row[f"{phase}_mean_ms"] = m[phase]["mean_ms"]
+            row[f"{phase}_p95_ms"] = m[phase]["p95_ms"]
+        rows.append({"operation": name, **row})
+    if not rows:
+        return pd.DataFrame(columns=["operation"])
+    return pd.DataFrame(rows).sort_values("total_mean_ms", ascending=False, ignore_index=True)
+
+
+def slow_queries(limit: int = None) -> list:
+    """Most recent slow queries, newest last."""
+    entries = list(_slow)
+    return entries[-limit:] if limit else entries
+
+
+def reset_metrics():
+    with _lock:
+        _stats.clear()
+        _slow.clear()
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+
+from utils.db_metrics import METRICS_ENABLED, InstrumentedConnection, record
+
+POOL_NAME = "expenxo"
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def db_config() -> dict:
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": int(os.getenv("DB_PORT", 3306)),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+        "ssl_ca": os.getenv("DB_SSL_CA"),
+        "allow_local_infile": os.getenv("DB_BULK_LOAD", "0") == "1",
+        # A streaming (unbuffered) read abandoned half-way leaves rows on the
+        # wire; drain them on close instead of raising "Unread result found"
+        # and returning a connection the next checkout cannot use.
+        "consume_results": True,
+    }
+
+
+def get_pool() -> pooling.MySQLConnectionPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **db_config(),
+                )
+    return _pool
+
+
+def get_connection(timeout: float = POOL_TIMEOUT):
+    """
+    Check a live connection out of the pool.
+
+    Waits up to `timeout` seconds when the pool is exhausted. Every
+    checkout is pinged and transparently reconnected if the server dropped
+    it. `close()` returns the connection to the pool. The wait and ping
+    are recorded as the current operation's acquire time.
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn = get_pool().get_connection()
+            break
+        except PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+    try:
+        conn.ping(reconnect=True, attempts=2, delay=0)
+    except mysql.connector.Error:
+        conn.close()
+        raise
+
+    if not METRICS_ENABLED:
+        return conn
+    record("acquire", (time.perf_counter() - started) * 1000)
+    return InstrumentedConnection(conn)
+
+
+@contextmanager
+def db_connection():
+    """`with db_connection() as conn:` checkout that always returns the connection."""
+    conn = get_connection()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        conn.close()
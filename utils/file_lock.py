@@ -0,0 +1,40 @@
+import os
+import time
+from contextlib import contextmanager
+
+LOCK_TIMEOUT = 10.0
+# A lock older than this was left by a crashed holder.
+LOCK_STALE_SECONDS = 30.0
+
+
+@contextmanager
+def file_lock(lock_path: str, timeout: float = LOCK_TIMEOUT, stale_seconds: float = LOCK_STALE_SECONDS):
+    """
+    Cross-process exclusive lock: a lock file created with O_EXCL.
+
+    Works the same on every platform; a lock left behind for more than
+    `stale_seconds` is broken.
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_seconds:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
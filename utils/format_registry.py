@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from utils.file_lock import file_lock
+
+# Written at runtime (see .gitignore); a missing file means no known layouts.
+FORMAT_FILE = os.path.join("config", "bank_formats.json")
+# Serializes read-modify-write across processes (parse workers, servers).
+LOCK_FILE = f"{FORMAT_FILE}.lock"
+
+_FORMATS = None
+_LOCK = threading.Lock()
+
+
+def header_fingerprint(header) -> str:
+    """Fingerprint of a raw CSV header row (names and order)."""
+    joined = "\x1f".join(str(c).strip() for c in header)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16]
+
+
+def load_formats() -> dict:
+    try:
+        with open(FORMAT_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Failed to load bank formats: {e}")
+        return {}
+
+
+def save_formats(formats) -> bool:
+    try:
+        directory = os.path.dirname(FORMAT_FILE)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(formats, f, indent=4)
+            os.replace(tmp_path, FORMAT_FILE)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return True
+    except Exception as e:
+        print(f"Failed to save bank formats: {e}")
+        return False
+
+
+def _formats() -> dict:
+    global _FORMATS
+    if _FORMATS is None:
+        _FORMATS = load_formats()
+    return _FORMATS
+
+
+def _reload() -> dict:
+    global _FORMATS
+    _FORMATS = load_formats()
+    return _FORMATS
+
+
+def get_format(header):
+    """Return the stored {columns, options} entry for this header, or None."""
+    fingerprint = header_fingerprint(header)
+    with _LOCK:
+        known = _formats().get(fingerprint)
+        if known is None:
+            # Another process (e.g. a parse worker) may have registered it.
+            known = _reload().get(fingerprint)
+        return known
+
+
+def register_format(header, columns: dict, options: dict = None, name: str = None) -> str:
+    """
+    Register a bank layout so uploads with this exact header skip detection.
+
+    `columns` maps canonical fields (date, amount, description, category)
+    to raw header names; unused fields map to None.
+    """
+    header = [str(c) for c in header]
+    unknown = [c for c in columns.values() if c and c not in header]
+    if unknown:
+        raise ValueError(f"Columns not in header: {unknown}")
+
+    fingerprint = header_fingerprint(header)
+    with _LOCK, file_lock(LOCK_FILE):
+        formats = _reload()
+        existing = formats.get(fingerprint, {})
+        formats[fingerprint] = {
+            "name": name or existing.get("name") or fingerprint,
+            "header": header,
+            "columns": dict(columns),
+            "options": dict(options or {}),
+        }
+        save_formats(formats)
+    return fingerprint
+
+
+def forget_format(header) -> bool:
+    with _LOCK, file_lock(LOCK_FILE):
+        formats = _reload()
+        if formats.pop(header_fingerprint(header), None) is None:
+            return False
+        save_formats(formats)
+        return True
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+import streamlit as st
+
+from utils.storage import get_storage
+
+# The logged-in user is resolved once at login and kept in the session;
+# reruns read it from there instead of querying `users`. After
+# IDENTITY_TTL_SECONDS it is re-read once, so role changes and deleted
+# accounts still take effect without a new login.
+IDENTITY_TTL_SECONDS = float(os.getenv("IDENTITY_TTL_SECONDS", 900))
+SESSION_KEY = "identity"
+
+# username -> time of the last invalidation, shared by every session in
+# this process; a cached identity resolved before it is stale.
+_invalidated = {}
+_invalidated_lock = threading.Lock()
+
+
+# ---------------------- RESOLUTION ----------------------
+def build_identity(user: dict) -> dict:
+    return {
+        "id": int(user["id"]) if user.get("id") is not None else None,
+        "username": user["username"],
+        "display_name": f"{user['first_name']} {user['last_name']}",
+        "role": user.get("role") or "user",
+        "resolved_at": time.time(),
+    }
+
+
+def resolve_identity(username):
+    """One lookup by username; None if the account no longer exists."""
+    user = get_storage().get_identity(username)
+    return build_identity(user) if user else None
+
+
+def is_stale(identity: dict, now=None) -> bool:
+    now = time.time() if now is None else now
+    if now - identity["resolved_at"] >= IDENTITY_TTL_SECONDS:
+        return True
+    return _invalidated.get(identity["username"], 0) >= identity["resolved_at"]
+
+
+# ---------------------- SESSION CACHE ----------------------
+def set_identity(identity: dict):
+    """Cache `identity` in the session (also fills the legacy session keys)."""
+    st.session_state[SESSION_KEY] = identity
+    st.session_state["logged_in"] = True
+    st.session_state["user"] = identity["username"]
+    st.session_state["name"] = identity["display_name"]
+    st.session_state["role"] = identity["role"]
+
+
+def get_identity():
+    """
+    The session's identity, re-resolved only when it expired or was
+    invalidated. Returns None when nobody is logged in or the account is gone.
+    """
+    identity = st.session_state.get(SESSION_KEY)
+    if identity is None or not is_stale(identity):
+        return identity
+
+    try:
+        fresh = resolve_identity(identity["username"])
+    except Exception as e:
+        # Keep serving the cached identity rather than logging the user out
+        # because the database blinked.
+        print("Error refreshing identity:", e)
+        return identity
+
+    if fresh is None:
+        clear_identity()
+        return None
+    set_identity(fresh)
+    return fresh
+
+
+def clear_identity():
+    for key in (SESSION_KEY, "logged_in", "user", "name", "role"):
+        st.session_state.pop(key, None)
+
+
+def invalidate_identity(username):
+    """Force every session of `username` to re-resolve on its next rerun."""
+    with _invalidated_lock:
+        _invalidated[username] = time.time()
@@ -0,0 +1,482 @@
+import csv
+import os
+import tempfile
+import time
+from functools import lru_cache
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from utils.migrations import ensure_schema
+from utils.rollup import ROLLUP_TABLE_COLUMNS, rollup_records
+
+INSERT_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+BULK_LOAD = os.getenv("DB_BULK_LOAD", "0") == "1"
+# After a failed LOAD DATA, uploads use batched inserts for this long
+# before trying the bulk path again.
+BULK_LOAD_RETRY_SECONDS = float(os.getenv("DB_BULK_LOAD_RETRY_SECONDS", 300))
+
+TRANSACTION_COLUMNS = ("username", "date", "category", "description", "amount")
+
+_bulk_load_retry_at = 0.0
+
+
+# ---------------------- RECORDS ----------------------
+def transaction_records(df: pd.DataFrame, username: str) -> list:
+    """Build insert tuples column-wise from a normalized frame."""
+    n = len(df)
+    dates = df["date"].array.to_pydatetime().tolist()
+    categories = df["category"].tolist() if "category" in df.columns else repeat("uncategorized", n)
+    descriptions = df["description"].tolist()
+    amounts = df["amount"].astype(float).tolist()
+    return list(zip(repeat(username, n), dates, categories, descriptions, amounts))
+
+
+@lru_cache(maxsize=16)
+def _multi_row_insert(rows: int, table: str = "transactions", columns=TRANSACTION_COLUMNS, verb="INSERT") -> str:
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return (
+        f"{verb} INTO {table} ({', '.join(columns)}) VALUES "
+        + ", ".join([placeholders] * rows)
+    )
+
+
+def upsert_rollup(cursor, username: str, df: pd.DataFrame):
+    """Fold the rows of `df` into monthly_category_totals."""
+    upsert_rollup_records(cursor, rollup_records(df, username))
+
+
+def upsert_rollup_records(cursor, records):
+    """Merge ROLLUP_TABLE_COLUMNS tuples into monthly_category_totals."""
+    if not records:
+        return
+    cursor.execute(
+        _multi_row_insert(len(records), "monthly_category_totals", ROLLUP_TABLE_COLUMNS)
+        + """
+        ON DUPLICATE KEY UPDATE
+            total = total + VALUES(total),
+            txn_count = txn_count + VALUES(txn_count),
+            min_amount = LEAST(min_amount, VALUES(min_amount)),
+            max_amount = GREATEST(max_amount, VALUES(max_amount)),
+            spend = spend + VALUES(spend)
+        """,
+        [value for record in records for value in record],
+    )
+
+
+BUDGET_COLUMNS = ("username", "month", "category", "budget_amount")
+
+
+def upsert_budget_records(cursor, username: str, records, batch_size: int = INSERT_BATCH_SIZE) -> int:
+    """Write (month, category, amount) records as multi-row budget upserts."""
+    rows = [(username, month, category, float(amount)) for month, category, amount in records]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            _multi_row_insert(len(batch), "budgets", BUDGET_COLUMNS)
+            + " ON DUPLICATE KEY UPDATE budget_amount = VALUES(budget_amount)",
+            [value for row in batch for value in row],
+        )
+    return len(rows)
+
+
+def insert_rows(cursor, table: str, columns, rows, batch_size: int = INSERT_BATCH_SIZE) -> int:
+    """Plain multi-row INSERTs of `batch_size` tuples each; returns the row count."""
+    rows = list(rows)
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            _multi_row_insert(len(batch), table, tuple(columns)),
+            [value for row in batch for value in row],
+        )
+    return len(rows)
+
+
+# ---------------------- BULK LOAD ----------------------
+def _bulk_load_enabled() -> bool:
+    return BULK_LOAD and time.monotonic() >= _bulk_load_retry_at
+
+
+def _load_data_local(cursor, records) -> bool:
+    """
+    Load records through LOAD DATA LOCAL INFILE.
+
+    Returns False if the load failed (local infile not allowed, or a
+    transient error); the caller falls back for this call, and the bulk
+    path rests for BULK_LOAD_RETRY_SECONDS.
+    """
+    global _bulk_load_retry_at
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+            for username, date, category, description, amount in records:
+                writer.writerow([username, date.strftime("%Y-%m-%d %H:%M:%S"), category, description, repr(amount)])
+
+        cursor.execute(
+            f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE transactions
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            ({', '.join(TRANSACTION_COLUMNS)})
+            """,
+            (path,),
+        )
+        return True
+    except Exception as e:
+        print(f"Bulk load failed, falling back to batched inserts: {e}")
+        _bulk_load_retry_at = time.monotonic() + BULK_LOAD_RETRY_SECONDS
+        return False
+    finally:
+        os.remove(path)
+
+
+# ---------------------- INGEST ----------------------
+def bulk_insert_transactions(
+    conn,
+    username: str,
+    df: pd.DataFrame,
+    batch_size: int = INSERT_BATCH_SIZE,
+    progress_callback=None,
+    fingerprints: pd.Series = None,
+    on_commit=None,
+) -> dict:
+    """
+    Insert a normalized frame into `transactions`.
+
+    Rows go out as multi-row INSERTs of `batch_size` rows, committed one
+    batch at a time, or in one LOAD DATA LOCAL INFILE when DB_BULK_LOAD=1
+    and the server allows it. Each batch folds its rows into
+    monthly_category_totals in the same transaction.
+    `progress_callback(done, total)` is called after every commit. When `fingerprints` is given (one per row), they
+    are recorded in the same commit as their rows. `on_commit(cursor, done)`
+    runs inside each batch's transaction, just before it commits.
+
+    Returns {"rows", "batches", "seconds", "rows_per_sec"}.
+    """
+    started = time.perf_counter()
+    total = len(df)
+    done, batches = 0, 0
+
+    records = transaction_records(df, username)
+    fp_records = (
+        fingerprint_records(username, fingerprints, df["date"])
+        if fingerprints is not None
+        else None
+    )
+    cursor = conn.cursor()
+
+    if records and _bulk_load_enabled() and _load_data_local(cursor, records):
+        upsert_rollup(cursor, username, df)
+        if fp_records:
+            for start in range(0, total, batch_size):
+                _insert_fingerprints(cursor, fp_records[start:start + batch_size])
+        if on_commit:
+            on_commit(cursor, total)
+        conn.commit()
+        done, batches = total, 1
+        if progress_callback:
+            progress_callback(done, total)
+    else:
+        for start in range(0, total, batch_size):
+            batch = records[start:start + batch_size]
+            cursor.execute(
+                _multi_row_insert(len(batch)),
+                [value for record in batch for value in record],
+            )
+            upsert_rollup(cursor, username, df.iloc[start:start + batch_size])
+            if fp_records:
+                _insert_fingerprints(cursor, fp_records[start:start + batch_size])
+            if on_commit:
+                on_commit(cursor, done + len(batch))
+            conn.commit()
+            done += len(batch)
+            batches += 1
+            if progress_callback:
+                progress_callback(done, total)
+
+    cursor.close()
+    seconds = time.perf_counter() - started
+    return {
+        "rows": done,
+        "batches": batches,
+        "seconds": seconds,
+        "rows_per_sec": done / seconds if seconds > 0 else 0.0,
+    }
+
+
+# ---------------------- DELTA INGEST ----------------------
+FINGERPRINT_COLUMNS = ("username", "fingerprint", "date")
+
+
+def ensure_fingerprint_table(conn):
+    """The table is created by migration 3; see utils.migrations."""
+    ensure_schema(conn)
+
+
+def fingerprint_records(username: str, fingerprints: pd.Series, dates: pd.Series) -> list:
+    n = len(fingerprints)
+    return list(zip(
+        repeat(username, n),
+        fingerprints.tolist(),
+        dates.array.to_pydatetime().tolist(),
+    ))
+
+
+def _insert_fingerprints(cursor, batch):
+    if batch:
+        cursor.execute(
+            _multi_row_insert(len(batch), "transaction_fingerprints", FINGERPRINT_COLUMNS, "INSERT IGNORE"),
+            [value for record in batch for value in record],
+        )
+
+
+def insert_fingerprints(cursor, records, batch_size: int = INSERT_BATCH_SIZE):
+    for start in range(0, len(records), batch_size):
+        _insert_fingerprints(cursor, records[start:start + batch_size])
+
+
+def stored_fingerprint_records(username: str, frame: pd.DataFrame, fingerprinter=None) -> list:
+    """
+    Fingerprint records for rows already in `transactions`.
+
+    `frame` must be in (date, id) order; identical rows are numbered in
+    that order, as an upload of them would be. Pass the same
+    `fingerprinter` for consecutive chunks of one user's history.
+    """
+    if frame.empty:
+        return []
+    fingerprinter = fingerprinter or RowFingerprinter()
+    return fingerprint_records(username, fingerprinter(frame), frame["date"])
+
+
+class RowFingerprinter:
+    """
+    Stable 64-bit fingerprints of (date, amount, description, account).
+
+    Identical rows within one upload are told apart by their occurrence
+    number, counted across every chunk passed to the same instance, so two
+    genuine same-day purchases survive while the same pair seen again in
+    an overlapping statement does not.
+    """
+
+    def __init__(self, account: str = ""):
+        self.account = account
+        self._seen = {}
+
+    def __call__(self, df: pd.DataFrame) -> pd.Series:
+        key = pd.DataFrame({
+            "date": df["date"].dt.strftime("%Y-%m-%d"),
+            "paise": (df["amount"].astype(float) * 100).round().astype("int64"),
+            "description": (
+                df["description"].astype(str).str.lower()
+                .str.replace(r"\s+", " ", regex=True).str.strip()
+            ),
+            "account": df["account"].astype(str) if "account" in df.columns else self.account,
+        })
+        base = pd.util.hash_pandas_object(key, index=False)
+
+        prior = base.map(self._seen).fillna(0).astype("int64")
+        occurrence = prior + base.groupby(base.to_numpy()).cumcount()
+        counts = base.value_counts()
+        for value, count in counts.items():
+            self._seen[value] = self._seen.get(value, 0) + count
+
+        return pd.util.hash_pandas_object(
+            pd.DataFrame({"base": base.to_numpy(), "occurrence": occurrence.to_numpy()}),
+            index=False,
+        ).set_axis(df.index)
+
+
+class DeltaIngest:
+    """
+    Insert only rows that are not already stored for a user.
+
+    Rows dated after the user's high-water mark (latest fingerprinted
+    date) are new by definition; the rest are hash-joined against the
+    fingerprints stored for their date range in one query per chunk.
+    """
+
+    def __init__(self, conn, username: str, account: str = ""):
+        self.conn = conn
+        self.username = username
+        self.fingerprinter = RowFingerprinter(account)
+        ensure_fingerprint_table(conn)
+        self.high_water_mark = self._high_water_mark()
+        self.summary = {"rows": 0, "inserted": 0, "skipped": 0, "seconds": 0.0}
+
+    def _high_water_mark(self):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT MAX(date) FROM transaction_fingerprints WHERE username=%s",
+            (self.username,),
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        return pd.Timestamp(row[0]) if row and row[0] else None
+
+    def _existing(self, start, end) -> np.ndarray:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT fingerprint FROM transaction_fingerprints "
+            "WHERE username=%s AND date BETWEEN %s AND %s",
+            (self.username, start.date(), end.date()),
+        )
+        existing = np.fromiter((r[0] for r in cursor.fetchall()), dtype=np.uint64)
+        cursor.close()
+        return existing
+
+    def split(self, df: pd.DataFrame):
+        """Return (new_rows, their_fingerprints, skipped_count) for a chunk."""
+        fingerprints = self.fingerprinter(df)
+        is_new = np.ones(len(df), dtype=bool)
+
+        if self.high_water_mark is not None:
+            overlap = (df["date"].dt.normalize() <= self.high_water_mark).to_numpy()
+            if overlap.any():
+                existing = self._existing(df["date"][overlap].min(), self.high_water_mark)
+                is_new[overlap] = ~np.isin(fingerprints.to_numpy()[overlap], existing)
+
+        return df[is_new], fingerprints[is_new], int((~is_new).sum())
+
+    def ingest(self, df: pd.DataFrame, on_commit=None, **kwargs) -> dict:
+        """
+        Insert the new rows of a chunk; returns bulk_insert_transactions stats plus `skipped`.
+
+        `on_commit(cursor, consumed)` is told how many rows of `df`, duplicates
+        included, are settled once the current batch commits.
+        """
+        new_rows, fingerprints, skipped = self.split(df)
+
+        hook = None
+        if on_commit:
+            ends = df.index.get_indexer(new_rows.index) + 1
+
+            def hook(cursor, done):
+                on_commit(cursor, len(df) if done == len(new_rows) else int(ends[done - 1]))
+
+        stats = bulk_insert_transactions(
+            self.conn, self.username, new_rows, fingerprints=fingerprints, on_commit=hook, **kwargs
+        )
+        stats["skipped"] = skipped
+
+        if on_commit and new_rows.empty:
+            cursor = self.conn.cursor()
+            on_commit(cursor, len(df))
+            self.conn.commit()
+            cursor.close()
+
+        self.summary["rows"] += len(df)
+        self.summary["inserted"] += stats["rows"]
+        self.summary["skipped"] += skipped
+        self.summary["seconds"] += stats["seconds"]
+        return stats
+
+
+# ---------------------- RESUMABLE JOBS ----------------------
+def ensure_job_table(conn):
+    ensure_schema(conn)
+
+
+class IngestJob:
+    """
+    Checkpointed delta ingest of one uploaded file for one user.
+
+    The number of input rows settled so far is written to `ingest_jobs` in
+    the same transaction as every batch. Feeding the same file again (same
+    content hash, same chunk order) skips those rows and carries on from
+    the last committed batch; a finished job ingests nothing.
+    """
+
+    def __init__(self, conn, username: str, file_hash: str, account: str = ""):
+        self.conn = conn
+        self.username = username
+        self.file_hash = file_hash
+        ensure_job_table(conn)
+
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT rows_committed, status FROM ingest_jobs WHERE username=%s AND file_hash=%s",
+            (username, file_hash),
+        )
+        row = cursor.fetchone()
+        if row:
+            self.rows_committed, self.status = int(row[0]), row[1]
+        else:
+            cursor.execute(
+                "INSERT INTO ingest_jobs (username, file_hash, rows_committed, status) "
+                "VALUES (%s, %s, 0, 'running')",
+                (username, file_hash),
+            )
+            conn.commit()
+            self.rows_committed, self.status = 0, "running"
+        cursor.close()
+
+        self.resumed_from = self.rows_committed
+        self.delta = None if self.done else DeltaIngest(conn, username, account)
+        self._position = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+    @property
+    def summary(self) -> dict:
+        summary = dict(self.delta.summary) if self.delta else {
+            "rows": 0, "inserted": 0, "skipped": 0, "seconds": 0.0
+        }
+        summary["resumed_from"] = self.resumed_from
+        return summary
+
+    def ingest(self, df: pd.DataFrame, **kwargs):
+        """Ingest the next chunk of the file, skipping rows an earlier attempt committed."""
+        if self.done:
+            return None
+
+        start = self._position
+        self._position += len(df)
+        skip = min(max(self.rows_committed - start, 0), len(df))
+
+        # Committed rows still pass through the fingerprinter so occurrence
+        # numbers line up with the earlier attempt.
+        if skip:
+            self.delta.fingerprinter(df.iloc[:skip])
+        if skip == len(df):
+            return None
+
+        base = start + skip
+
+        def checkpoint(cursor, consumed):
+            self.rows_committed = base + consumed
+            cursor.execute(
+                "UPDATE ingest_jobs SET rows_committed=%s WHERE username=%s AND file_hash=%s",
+                (self.rows_committed, self.username, self.file_hash),
+            )
+
+        return self.delta.ingest(df.iloc[skip:], on_commit=checkpoint, **kwargs)
+
+    def finish(self):
+        if self.done:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE ingest_jobs SET status='done' WHERE username=%s AND file_hash=%s",
+            (self.username, self.file_hash),
+        )
+        self.conn.commit()
+        cursor.close()
+        self.status = "done"
+
+
+if __name__ == "__main__":
+    import sys
+
+    from utils.storage import get_storage
+
+    # python -m utils.ingest [username]: fingerprint transactions stored
+    # before delta ingest existed, so overlapping uploads skip them.
+    written = get_storage().backfill_fingerprints(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Backfilled {written} fingerprint(s).")
@@ -0,0 +1,523 @@
+import threading
+
+# Each migration is (version, name, {dialect: [statements]}). Versions are
+# applied in order and recorded in `schema_migrations`; append new ones,
+# never edit one that has shipped. A statement may also be a function of
+# (cursor, dialect) for the steps that depend on what is already there.
+
+SCHEMA = {"mysql": "DATABASE()", "embedded": "current_schema()"}
+BUDGET_KEY = ["username", "month", "category"]
+
+BUDGETS_TABLE = {
+    "mysql": """
+        CREATE TABLE budgets (
+            username VARCHAR(255) NOT NULL,
+            month CHAR(7) NOT NULL,
+            category VARCHAR(255) NOT NULL,
+            budget_amount DECIMAL(14, 2) NOT NULL,
+            PRIMARY KEY (username, month, category)
+        )
+    """,
+    "embedded": """
+        CREATE TABLE budgets (
+            username VARCHAR NOT NULL,
+            month VARCHAR NOT NULL,
+            category VARCHAR NOT NULL,
+            budget_amount DOUBLE,
+            PRIMARY KEY (username, month, category)
+        )
+    """,
+}
+
+COPY_LEGACY_BUDGETS = {
+    "mysql": "INSERT IGNORE INTO budgets",
+    "embedded": "INSERT OR IGNORE INTO budgets",
+}
+
+
+def _columns(cursor, dialect, table) -> list:
+    cursor.execute(
+        f"""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = {SCHEMA[dialect]} AND table_name = {PLACEHOLDER[dialect]}
+        """,
+        (table,),
+    )
+    return [str(row[0]).lower() for row in cursor.fetchall()]
+
+
+def _primary_key(cursor, dialect, table) -> list:
+    cursor.execute(
+        f"""
+        SELECT k.column_name
+        FROM information_schema.key_column_usage k
+        JOIN information_schema.table_constraints t
+          ON t.constraint_name = k.constraint_name
+         AND t.table_schema = k.table_schema
+         AND t.table_name = k.table_name
+        WHERE t.constraint_type = 'PRIMARY KEY'
+          AND k.table_schema = {SCHEMA[dialect]} AND k.table_name = {PLACEHOLDER[dialect]}
+        ORDER BY k.ordinal_position
+        """,
+        (table,),
+    )
+    return [str(row[0]).lower() for row in cursor.fetchall()]
+
+
+def _rekey_budgets(cursor, dialect):
+    """
+    Replace a budgets table that predates migration 1 with the
+    (username, month, category) keyed one set_budgets upserts into.
+
+    The old table is kept as `budgets_legacy`. Its rows are copied over
+    when it has a username column; the older user_id-keyed rows cannot be
+    matched to users and have to be uploaded again.
+    """
+    current = _columns(cursor, dialect, "budgets")
+    if not current or _primary_key(cursor, dialect, "budgets") != BUDGET_KEY:
+        if current:
+            if _columns(cursor, dialect, "budgets_legacy"):
+                raise RuntimeError(
+                    "Both `budgets` and `budgets_legacy` exist and `budgets` is not keyed by "
+                    "(username, month, category). Merge or drop one of them, then migrate again."
+                )
+            cursor.execute("ALTER TABLE budgets RENAME TO budgets_legacy")
+        cursor.execute(BUDGETS_TABLE[dialect])
+
+    # Copied even when the new table is already there, in case an earlier
+    # run stopped between creating it and filling it.
+    legacy = _columns(cursor, dialect, "budgets_legacy")
+    if set(BUDGET_KEY + ["budget_amount"]) <= set(legacy):
+        cursor.execute(
+            f"""
+            {COPY_LEGACY_BUDGETS[dialect]}
+            SELECT username, month, category, MAX(budget_amount) FROM budgets_legacy
+            WHERE username IS NOT NULL AND month IS NOT NULL AND category IS NOT NULL
+              AND budget_amount IS NOT NULL
+            GROUP BY username, month, category
+            """
+        )
+    elif legacy:
+        print(
+            "Renamed the user_id-keyed budgets table to budgets_legacy; "
+            "its budgets have to be uploaded again."
+        )
+
+
+MIGRATIONS = [
+    (1, "base tables", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username VARCHAR(255) NOT NULL PRIMARY KEY,
+                first_name VARCHAR(255),
+                last_name VARCHAR(255),
+                contact VARCHAR(20),
+                email VARCHAR(255),
+                password_ VARCHAR(255),
+                role VARCHAR(20) NOT NULL DEFAULT 'user',
+                UNIQUE KEY uq_users_email (email)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(255) NOT NULL,
+                date DATETIME NOT NULL,
+                category VARCHAR(255),
+                description TEXT,
+                amount DECIMAL(14, 2) NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS budgets (
+                username VARCHAR(255) NOT NULL,
+                month CHAR(7) NOT NULL,
+                category VARCHAR(255) NOT NULL,
+                budget_amount DECIMAL(14, 2) NOT NULL,
+                PRIMARY KEY (username, month, category)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS categories (
+                name VARCHAR(255) NOT NULL PRIMARY KEY,
+                color VARCHAR(16)
+            )
+            """,
+        ],
+        "embedded": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                username VARCHAR PRIMARY KEY,
+                first_name VARCHAR,
+                last_name VARCHAR,
+                contact VARCHAR,
+                email VARCHAR,
+                password_ VARCHAR,
+                role VARCHAR DEFAULT 'user'
+            )
+            """,
+            "CREATE SEQUENCE IF NOT EXISTS transactions_id_seq",
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id BIGINT DEFAULT nextval('transactions_id_seq'),
+                username VARCHAR NOT NULL,
+                date TIMESTAMP NOT NULL,
+                month VARCHAR NOT NULL,
+                category VARCHAR,
+                description VARCHAR,
+                amount DOUBLE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS budgets (
+                username VARCHAR NOT NULL,
+                month VARCHAR NOT NULL,
+                category VARCHAR NOT NULL,
+                budget_amount DOUBLE,
+                PRIMARY KEY (username, month, category)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS categories (
+                name VARCHAR PRIMARY KEY,
+                color VARCHAR
+            )
+            """,
+        ],
+    }),
+    (2, "transactions month column and indexes", {
+        # A stored month lets the month/category aggregates group and join
+        # on a plain column instead of DATE_FORMAT(date, ...), which no
+        # index can serve. (username, month, category, amount) covers the
+        # monthly summary outright.
+        "mysql": [
+            """
+            ALTER TABLE transactions
+            ADD COLUMN month CHAR(7) GENERATED ALWAYS AS (DATE_FORMAT(date, '%Y-%m')) STORED
+            """,
+            "CREATE INDEX idx_transactions_user_date ON transactions (username, date)",
+            "CREATE INDEX idx_transactions_user_category_date ON transactions (username, category, date)",
+            "CREATE INDEX idx_transactions_user_month ON transactions (username, month, category, amount)",
+        ],
+        # The embedded table stores month at insert time, and DuckDB's
+        # per-block min/max zone maps already prune date range scans.
+        "embedded": [],
+    }),
+    (3, "ingest bookkeeping tables", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS transaction_fingerprints (
+                username VARCHAR(255) NOT NULL,
+                fingerprint BIGINT UNSIGNED NOT NULL,
+                date DATE NOT NULL,
+                PRIMARY KEY (username, fingerprint),
+                KEY idx_fingerprints_user_date (username, date)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                username VARCHAR(255) NOT NULL,
+                file_hash CHAR(64) NOT NULL,
+                rows_committed BIGINT NOT NULL DEFAULT 0,
+                status VARCHAR(16) NOT NULL DEFAULT 'running',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (username, file_hash)
+            )
+            """,
+        ],
+        "embedded": [
+            """
+            CREATE TABLE IF NOT EXISTS transaction_fingerprints (
+                username VARCHAR NOT NULL,
+                fingerprint UBIGINT NOT NULL,
+                date DATE NOT NULL,
+                PRIMARY KEY (username, fingerprint)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                username VARCHAR NOT NULL,
+                file_hash VARCHAR NOT NULL,
+                rows_committed BIGINT NOT NULL DEFAULT 0,
+                status VARCHAR NOT NULL DEFAULT 'running',
+                updated_at TIMESTAMP DEFAULT current_timestamp,
+                PRIMARY KEY (username, file_hash)
+            )
+            """,
+        ],
+    }),
+    (4, "monthly category rollup", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                username VARCHAR(255) NOT NULL,
+                month CHAR(7) NOT NULL,
+                category VARCHAR(255) NOT NULL,
+                total DECIMAL(16, 2) NOT NULL,
+                txn_count BIGINT NOT NULL,
+                min_amount DECIMAL(14, 2) NOT NULL,
+                max_amount DECIMAL(14, 2) NOT NULL,
+                PRIMARY KEY (username, month, category)
+            )
+            """,
+            """
+            REPLACE INTO monthly_category_totals
+            SELECT username, month, COALESCE(category, 'uncategorized'),
+                   SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+            FROM transactions
+            GROUP BY username, month, COALESCE(category, 'uncategorized')
+            """,
+        ],
+        "embedded": [
+            """
+            CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                username VARCHAR NOT NULL,
+                month VARCHAR NOT NULL,
+                category VARCHAR NOT NULL,
+                total DOUBLE NOT NULL,
+                txn_count BIGINT NOT NULL,
+                min_amount DOUBLE NOT NULL,
+                max_amount DOUBLE NOT NULL,
+                PRIMARY KEY (username, month, category)
+            )
+            """,
+            """
+            INSERT OR REPLACE INTO monthly_category_totals
+            SELECT username, month, COALESCE(category, 'uncategorized'),
+                   SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+            FROM transactions
+            GROUP BY username, month, COALESCE(category, 'uncategorized')
+            """,
+        ],
+    }),
+    (5, "monthly partitions for transactions", {
+        # Every unique key of a partitioned table must include the
+        # partitioning column, hence the (id, date) primary key. Monthly
+        # partitions are split out of p_future by
+        # MySQLStorage.ensure_partitions as time moves on.
+        "mysql": [
+            "ALTER TABLE transactions DROP PRIMARY KEY, ADD PRIMARY KEY (id, date)",
+            """
+            ALTER TABLE transactions PARTITION BY RANGE (TO_DAYS(date)) (
+                PARTITION p_start VALUES LESS THAN (TO_DAYS('1970-01-01')),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+            """,
+        ],
+        # DuckDB prunes by per-block min/max instead; old months go to
+        # Parquet through utils.archive either way.
+        "embedded": [],
+    }),
+    (6, "numeric user id", {
+        # A compact surrogate key for the session identity cache; username
+        # stays the primary key every other table refers to.
+        "mysql": [
+            "ALTER TABLE users ADD COLUMN id BIGINT NOT NULL AUTO_INCREMENT UNIQUE FIRST",
+        ],
+        "embedded": [
+            "CREATE SEQUENCE IF NOT EXISTS users_id_seq",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS id BIGINT DEFAULT nextval('users_id_seq')",
+        ],
+    }),
+    (7, "nightly forecasts", {
+        # Written by models.forecast_job: the latest forecast of every
+        # (user, category) for the next few months, plus one row per run.
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS forecasts (
+                username VARCHAR(255) NOT NULL,
+                category VARCHAR(255) NOT NULL,
+                month CHAR(7) NOT NULL,
+                horizon TINYINT NOT NULL,
+                prediction DECIMAL(14, 2) NOT NULL,
+                model_version VARCHAR(64) NOT NULL,
+                run_id BIGINT NOT NULL,
+                PRIMARY KEY (username, category, month)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS forecast_runs (
+                run_id BIGINT NOT NULL PRIMARY KEY,
+                started_at DATETIME NOT NULL,
+                seconds DOUBLE NOT NULL,
+                users BIGINT NOT NULL,
+                series BIGINT NOT NULL,
+                forecasts BIGINT NOT NULL,
+                failed_users BIGINT NOT NULL
+            )
+            """,
+        ],
+        "embedded": [
+            """
+            CREATE TABLE IF NOT EXISTS forecasts (
+                username VARCHAR NOT NULL,
+                category VARCHAR NOT NULL,
+                month VARCHAR NOT NULL,
+                horizon INTEGER NOT NULL,
+                prediction DOUBLE NOT NULL,
+                model_version VARCHAR NOT NULL,
+                run_id BIGINT NOT NULL,
+                PRIMARY KEY (username, category, month)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS forecast_runs (
+                run_id BIGINT PRIMARY KEY,
+                started_at TIMESTAMP NOT NULL,
+                seconds DOUBLE NOT NULL,
+                users BIGINT NOT NULL,
+                series BIGINT NOT NULL,
+                forecasts BIGINT NOT NULL,
+                failed_users BIGINT NOT NULL
+            )
+            """,
+        ],
+    }),
+    (8, "fingerprint backfill bookkeeping", {
+        # Users whose transactions stored before delta ingest have been
+        # fingerprinted (see backfill_fingerprints in utils.storage).
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS fingerprint_backfills (
+                username VARCHAR(255) NOT NULL PRIMARY KEY,
+                backfilled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+        "embedded": [
+            """
+            CREATE TABLE IF NOT EXISTS fingerprint_backfills (
+                username VARCHAR PRIMARY KEY,
+                backfilled_at TIMESTAMP DEFAULT current_timestamp
+            )
+            """,
+        ],
+    }),
+    (9, "monthly spend in rollup", {
+        # Sum of the positive amounts alone, which the forecasts train on.
+        # Archived months are not in `transactions`; run
+        # `python -m utils.rollup rebuild` once after archiving has begun.
+        "mysql": [
+            "ALTER TABLE monthly_category_totals ADD COLUMN spend DECIMAL(16, 2) NOT NULL DEFAULT 0",
+            """
+            UPDATE monthly_category_totals r
+            JOIN (
+                SELECT username, month, COALESCE(category, 'uncategorized') AS category,
+                       SUM(GREATEST(amount, 0)) AS spend
+                FROM transactions
+                GROUP BY username, month, COALESCE(category, 'uncategorized')
+            ) t ON r.username = t.username AND r.month = t.month AND r.category = t.category
+            SET r.spend = t.spend
+            """,
+        ],
+        "embedded": [
+            "ALTER TABLE monthly_category_totals ADD COLUMN spend DOUBLE DEFAULT 0",
+            """
+            UPDATE monthly_category_totals r SET spend = t.spend
+            FROM (
+                SELECT username, month, COALESCE(category, 'uncategorized') AS category,
+                       SUM(GREATEST(amount, 0)) AS spend
+                FROM transactions
+                GROUP BY username, month, COALESCE(category, 'uncategorized')
+            ) t
+            WHERE r.username = t.username AND r.month = t.month AND r.category = t.category
+            """,
+        ],
+    }),
+    (10, "budgets keyed by username", {
+        # Migration 1 left any older budgets table in place, and upserts
+        # need the (username, month, category) primary key.
+        "mysql": [_rekey_budgets],
+        "embedded": [_rekey_budgets],
+    }),
+]
+
+PLACEHOLDER = {"mysql": "%s", "embedded": "?"}
+
+# MySQL errors meaning "already there": table exists, duplicate column,
+# duplicate index name. DDL auto-commits, so a migration interrupted
+# half-way is re-run from the top and must step over what it already did.
+ALREADY_APPLIED_ERRORS = {1050, 1060, 1061}
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def _ensure_version_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def applied_versions(conn) -> set:
+    cursor = conn.cursor()
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {int(row[0]) for row in cursor.fetchall()}
+    cursor.close()
+    return versions
+
+
+def pending_migrations(conn, dialect: str = "mysql") -> list:
+    done = applied_versions(conn)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in done]
+
+
+def migrate(conn, dialect: str = "mysql") -> list:
+    """
+    Apply every pending migration for `dialect` in version order.
+
+    Returns the versions applied by this call.
+    """
+    done = applied_versions(conn)
+    mark = PLACEHOLDER[dialect]
+    applied = []
+
+    for version, name, statements in MIGRATIONS:
+        if version in done:
+            continue
+        cursor = conn.cursor()
+        for statement in statements[dialect]:
+            try:
+                if callable(statement):
+                    statement(cursor, dialect)
+                else:
+                    cursor.execute(statement)
+            except Exception as e:
+                if getattr(e, "errno", None) not in ALREADY_APPLIED_ERRORS:
+                    raise
+        cursor.execute(
+            f"INSERT INTO schema_migrations (version, name) VALUES ({mark}, {mark})",
+            (version, name),
+        )
+        conn.commit()
+        cursor.close()
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+
+    return applied
+
+
+def ensure_schema(conn, dialect: str = "mysql"):
+    """Run `migrate` once per process and dialect."""
+    if dialect in _ready:
+        return
+    with _ready_lock:
+        if dialect not in _ready:
+            migrate(conn, dialect)
+            _ready.add(dialect)
+
+
+if __name__ == "__main__":
+    from utils.db_pool import db_connection
+
+    with db_connection() as conn:
+        applied = migrate(conn)
+    print(f"{len(applied)} migration(s) applied." if applied else "Schema is up to date.")
@@ -0,0 +1,115 @@
+import sys
+
+import pandas as pd
+
+# monthly_category_totals holds one row per (username, month, category)
+# with the sum, count, min and max of its transaction amounts, plus
+# `spend`, the sum of the positive amounts alone (what the forecasts
+# train on). Inserts fold into it incrementally; deletes recompute the
+# affected group, since a min or max cannot be "un-merged".
+ROLLUP_COLUMNS = ["month", "category", "total", "txn_count", "min_amount", "max_amount", "spend"]
+ROLLUP_KEY = ["username", "month", "category"]
+ROLLUP_TABLE_COLUMNS = ("username", *ROLLUP_COLUMNS)
+DEFAULT_CATEGORY = "uncategorized"
+
+
+def amount_aggregates(keyed: pd.DataFrame, keys) -> pd.DataFrame:
+    """Rollup aggregates of an `amount` column per `keys` group."""
+    return (
+        keyed.assign(spend=keyed["amount"].clip(lower=0))
+        .groupby(keys, sort=False)
+        .agg(total=("amount", "sum"), txn_count=("amount", "count"),
+             min_amount=("amount", "min"), max_amount=("amount", "max"), spend=("spend", "sum"))
+        .reset_index()
+    )
+
+
+def batch_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate a normalized frame into ROLLUP_COLUMNS rows."""
+    if df.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    category = (
+        df["category"].astype(object).fillna(DEFAULT_CATEGORY)
+        if "category" in df.columns
+        else pd.Series(DEFAULT_CATEGORY, index=df.index)
+    )
+    grouped = amount_aggregates(
+        pd.DataFrame({
+            "month": df["date"].dt.strftime("%Y-%m"),
+            "category": category,
+            "amount": df["amount"].astype(float),
+        }),
+        ["month", "category"],
+    )
+    grouped["total"] = grouped["total"].round(2)
+    grouped["spend"] = grouped["spend"].round(2)
+    return grouped[ROLLUP_COLUMNS]
+
+
+def rollup_records(df: pd.DataFrame, username: str) -> list:
+    grouped = batch_rollup(df)
+    return [
+        (username, month, category, float(total), int(count), float(low), float(high), float(spend))
+        for month, category, total, count, low, high, spend in grouped.itertuples(index=False)
+    ]
+
+
+def merge_rollups(*frames) -> pd.DataFrame:
+    """Combine rollup frames over the same keys (sums add, min/max fold)."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=ROLLUP_TABLE_COLUMNS)
+    merged = pd.concat(frames, ignore_index=True)
+    merged["total"] = merged["total"].astype(float)
+    merged["min_amount"] = merged["min_amount"].astype(float)
+    merged["max_amount"] = merged["max_amount"].astype(float)
+    merged["spend"] = merged["spend"].astype(float)
+    return (
+        merged.groupby(ROLLUP_KEY, as_index=False, sort=False)
+        .agg(total=("total", "sum"), txn_count=("txn_count", "sum"),
+             min_amount=("min_amount", "min"), max_amount=("max_amount", "max"),
+             spend=("spend", "sum"))
+    )[list(ROLLUP_TABLE_COLUMNS)]
+
+
+def compare_rollups(expected: pd.DataFrame, actual: pd.DataFrame, tolerance: float = 0.005) -> pd.DataFrame:
+    """
+    Return the groups where the stored rollup disagrees with a fresh
+    aggregation of the transactions, with a `problem` column:
+    "missing", "orphaned" or "mismatch".
+    """
+    merged = expected.merge(actual, on=ROLLUP_KEY, how="outer", suffixes=("", "_stored"), indicator=True)
+    problem = pd.Series("", index=merged.index)
+    problem[merged["_merge"] == "left_only"] = "missing"
+    problem[merged["_merge"] == "right_only"] = "orphaned"
+
+    both = merged["_merge"] == "both"
+    differs = merged["txn_count"].ne(merged["txn_count_stored"])
+    for column in ("total", "min_amount", "max_amount", "spend"):
+        differs |= (merged[column].astype(float) - merged[f"{column}_stored"].astype(float)).abs() > tolerance
+    problem[both & differs] = "mismatch"
+
+    merged["problem"] = problem
+    return merged[merged["problem"] != ""].drop(columns="_merge").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    from utils.storage import get_storage
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    username = sys.argv[2] if len(sys.argv) > 2 else None
+    storage = get_storage()
+
+    if command == "rebuild":
+        groups = storage.rebuild_rollup(username)
+        print(f"Rebuilt {groups} monthly_category_totals group(s).")
+    elif command == "check":
+        problems = storage.check_rollup(username)
+        if problems.empty:
+            print("monthly_category_totals is consistent.")
+        else:
+            print(problems.to_string(index=False))
+            sys.exit(1)
+    else:
+        sys.exit("usage: python -m utils.rollup [check|rebuild] [username]")
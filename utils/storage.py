@@ -0,0 +1,1353 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from utils.archive import (
+    archive_rollup, archived_months, month_bounds, prune_months, read_archive, remove_archived,
+    union_frames,
+)
+
+from utils.db_metrics import SLOW_QUERY_MS, instrument_methods, log_slow_query, operation, record
+from utils.db_pool import db_connection
+from utils.ingest import (
+    FINGERPRINT_COLUMNS, INSERT_BATCH_SIZE, IngestJob, RowFingerprinter, insert_fingerprints, insert_rows,
+    stored_fingerprint_records, upsert_budget_records, upsert_rollup, upsert_rollup_records,
+)
+from utils.migrations import ensure_schema, migrate
+from utils.rollup import ROLLUP_TABLE_COLUMNS, compare_rollups, merge_rollups
+
+# "mysql" (default) or "embedded" (DuckDB file, no server needed)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql").lower()
+EMBEDDED_DB_PATH = os.getenv("EMBEDDED_DB_PATH", os.path.join("data", "expenxo.duckdb"))
+READ_PAGE_SIZE = int(os.getenv("READ_PAGE_SIZE", 5000))
+# Open bounds for date-ranged reads; valid DATETIME values on both backends.
+EARLIEST_DATE = pd.Timestamp("1000-01-01")
+LATEST_DATE = pd.Timestamp("9999-12-31 23:59:59")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+USER_FIELDS = "username, first_name, last_name, contact, email, password_, role"
+# What a session needs to know about its user; never the password or contact.
+IDENTITY_FIELDS = "id, username, first_name, last_name, role"
+
+TRANSACTION_FIELDS = ("id", "username", "date", "category", "description", "amount")
+TRANSACTION_DTYPES = {
+    "id": "int64",
+    "username": "category",
+    "category": "category",
+    "description": "string",
+    "amount": "float64",
+}
+
+# Per-user monthly spend (positive amounts only, like the Predict page)
+# for the forecast job, in primary key order so every user's rows arrive
+# together. Groups without spend are kept so their user is still seen.
+MONTHLY_TOTALS_QUERY = """
+    SELECT username, month, category, spend AS total_spend
+    FROM monthly_category_totals
+    ORDER BY username, month, category
+"""
+MONTHLY_TOTALS_FIELDS = ("username", "month", "category", "total_spend")
+FORECAST_FIELDS = ("username", "category", "month", "horizon", "prediction", "model_version", "run_id")
+FORECAST_RUN_FIELDS = ("run_id", "started_at", "seconds", "users", "series", "forecasts", "failed_users")
+
+_storage = None
+_storage_lock = threading.Lock()
+
+# Fresh aggregation of transactions in monthly_category_totals' shape;
+# `{where}` narrows it to a user or a single group.
+ROLLUP_SELECT = """
+    SELECT username, month, COALESCE(category, 'uncategorized') AS category,
+           SUM(amount) AS total, COUNT(*) AS txn_count,
+           MIN(amount) AS min_amount, MAX(amount) AS max_amount,
+           SUM(GREATEST(amount, 0)) AS spend
+    FROM transactions
+    {where}
+    GROUP BY username, month, COALESCE(category, 'uncategorized')
+"""
+
+EMBEDDED_ROLLUP_MERGE = """
+    ON CONFLICT (username, month, category) DO UPDATE SET
+        total = total + excluded.total,
+        txn_count = txn_count + excluded.txn_count,
+        min_amount = least(min_amount, excluded.min_amount),
+        max_amount = greatest(max_amount, excluded.max_amount),
+        spend = spend + excluded.spend
+"""
+
+
+# ---------------------- READS ----------------------
+def transaction_query(mark, username=None, start_date=None, end_date=None, category=None,
+                      after=None, limit=None):
+    """
+    Build a transactions SELECT ordered by (date, id) for placeholder `mark`.
+
+    `after` is the (date, id) of the last row already seen, for keyset
+    pagination: the next page starts right after it through the
+    (username, date) index instead of skipping OFFSET rows.
+    """
+    clauses, params = [], []
+    if username is not None:
+        clauses.append(f"username = {mark}")
+        params.append(username)
+    if start_date and end_date:
+        clauses.append(f"date BETWEEN {mark} AND {mark}")
+        params.extend([start_date, end_date])
+    if category:
+        clauses.append(f"category = {mark}")
+        params.append(category)
+    if after is not None:
+        clauses.append(f"(date > {mark} OR (date = {mark} AND id > {mark}))")
+        params.extend([after[0], after[0], after[1]])
+
+    query = f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY date, id"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, params
+
+
+def transactions_frame(rows, columns=TRANSACTION_FIELDS) -> pd.DataFrame:
+    """Build a typed transactions frame straight from row tuples, no per-row dicts."""
+    df = pd.DataFrame.from_records(rows, columns=list(columns))
+    return typed_transactions(df)
+
+
+def monthly_totals_frame(rows) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=MONTHLY_TOTALS_FIELDS)
+    df["total_spend"] = df["total_spend"].astype(float)
+    return df
+
+
+def forecast_records(forecast: pd.DataFrame) -> list:
+    return list(forecast[list(FORECAST_FIELDS)].itertuples(index=False, name=None))
+
+
+def day_bounds(date):
+    """First and last instant of the day `date` falls on."""
+    day = pd.Timestamp(date).normalize()
+    return day, day + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+
+
+def typed_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df.astype({k: v for k, v in TRANSACTION_DTYPES.items() if k in df.columns})
+
+
+class TransactionReads:
+    """
+    Public transaction reads shared by both backends.
+
+    Each read unions the hot table (the backend's `_hot_*` methods) with
+    the archived months that can match its date range; archived copies win
+    over hot rows with the same id. Rows always come in (date, id) order.
+    """
+
+    def get_transactions(self, username, start_date=None, end_date=None, category=None):
+        rows = self._hot_transactions(username, start_date, end_date, category)
+        archived = read_archive(username, start_date, end_date, category)
+        if archived.empty:
+            return rows
+        ids = set(archived["id"].tolist())
+        merged = archived.astype(object).to_dict("records") + [r for r in rows if r["id"] not in ids]
+        return sorted(merged, key=lambda r: (pd.Timestamp(r["date"]), r["id"]))
+
+    def get_all_transactions(self):
+        return self.get_transactions(None)
+
+    def _segments(self, start_date=None, end_date=None):
+        """
+        Split [start_date, end_date] at archived month boundaries.
+
+        Yields ("hot", start, end) for stretches only the hot table can
+        hold and ("month", start, end) for archived months, in date order,
+        so a reader holds at most one archived month at a time.
+        """
+        if start_date and end_date:
+            start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        else:
+            start, end = EARLIEST_DATE, LATEST_DATE
+
+        for month in prune_months(archived_months(), start, end):
+            month_start, month_end = month_bounds(month)
+            month_end -= pd.Timedelta(microseconds=1)
+            if start < month_start:
+                yield "hot", start, month_start - pd.Timedelta(microseconds=1)
+            yield "month", max(start, month_start), min(end, month_end)
+            start = month_end + pd.Timedelta(microseconds=1)
+        if start <= end:
+            yield "hot", start, end
+
+    def _archived_month_frame(self, username, start, end, category) -> pd.DataFrame:
+        """One archived month merged with any hot rows dated in it."""
+        hot = self._hot_frame(username, start.to_pydatetime(), end.to_pydatetime(), category)
+        archived = read_archive(username, start, end, category)
+        return typed_transactions(union_frames(hot, archived))
+
+    def iter_transaction_pages(self, username=None, start_date=None, end_date=None, category=None,
+                               page_size=READ_PAGE_SIZE):
+        """Yield row-dict pages in (date, id) order: hot stretches by keyset pagination, archived months one at a time."""
+        for kind, start, end in self._segments(start_date, end_date):
+            if kind == "hot":
+                yield from self._hot_pages(
+                    username, start.to_pydatetime(), end.to_pydatetime(), category, page_size
+                )
+                continue
+            frame = self._archived_month_frame(username, start, end, category)
+            for offset in range(0, len(frame), page_size):
+                yield frame.iloc[offset:offset + page_size].astype(object).to_dict("records")
+
+    def iter_transaction_frames(self, username=None, start_date=None, end_date=None, category=None,
+                                chunk_size=READ_PAGE_SIZE):
+        """Yield typed DataFrame chunks in (date, id) order, reading one archived month at a time."""
+        for kind, start, end in self._segments(start_date, end_date):
+            if kind == "hot":
+                for frame in self._hot_frames(
+                    username, start.to_pydatetime(), end.to_pydatetime(), category, chunk_size
+                ):
+                    if not frame.empty:
+                        yield frame
+                continue
+            frame = self._archived_month_frame(username, start, end, category)
+            for offset in range(0, len(frame), chunk_size):
+                yield frame.iloc[offset:offset + chunk_size].reset_index(drop=True)
+
+    def get_transactions_frame(self, username=None, start_date=None, end_date=None, category=None):
+        """All matching transactions, hot and archived, as one typed DataFrame."""
+        hot = self._hot_frame(username, start_date, end_date, category)
+        archived = read_archive(username, start_date, end_date, category)
+        return typed_transactions(union_frames(hot, archived))
+
+    # ---- fingerprint backfill ----
+    def backfill_fingerprints(self, username=None) -> int:
+        """
+        Fingerprint the stored transactions of every user (or just
+        `username`) not backfilled yet; returns the fingerprints written.
+
+        Rows stored before delta ingest existed have no fingerprints, so an
+        overlapping upload would insert them again. Re-running is safe:
+        existing fingerprints are left alone.
+        """
+        written = 0
+        for user in self._users_to_backfill(username):
+            fingerprinter = RowFingerprinter()
+            for frame in self.iter_transaction_frames(user):
+                records = stored_fingerprint_records(user, frame, fingerprinter)
+                self._save_fingerprints(records)
+                written += len(records)
+            self._mark_backfilled(user)
+        return written
+
+    def _delete_archived(self, username, txn_id, hot_month=None):
+        """
+        Remove a transaction from the archive; returns its (month, category,
+        date) or None. A hot row (of `hot_month`) only has an archived copy
+        if its month's archival was interrupted.
+        """
+        if hot_month is not None and hot_month not in archived_months():
+            return None
+        removed = remove_archived(username, txn_id, hot_month)
+        return None if removed is None else (removed["month"], removed["category"], removed["date"])
+
+    def _day_fingerprint_records(self, username, date, hot: pd.DataFrame) -> list:
+        """Fingerprints of one user's day, given its hot rows."""
+        start, end = day_bounds(date)
+        day = union_frames(hot, read_archive(username, start, end))
+        return stored_fingerprint_records(username, typed_transactions(day))
+
+
+# ---------------------- MYSQL ----------------------
+@instrument_methods("mysql")
+class MySQLStorage(TransactionReads):
+    """Row-store backend on the shared MySQL connection pool."""
+
+    name = "mysql"
+
+    def __init__(self):
+        with db_connection() as conn:
+            ensure_schema(conn, "mysql")
+
+    # ---- users ----
+    def ensure_user(self, username):
+        """Create a placeholder account for `username` if it does not exist."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT username FROM users WHERE username=%s", (username,))
+            if not cursor.fetchone():
+                cursor.execute(
+                    "INSERT INTO users (username, first_name, last_name, contact, email, password_, role) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (username, username, username, "9999999999", f"{username}@example.com", "password", "user"),
+                )
+                conn.commit()
+
+    def create_user(self, username, first_name, last_name, contact, email, password, role="user"):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM users WHERE username=%s OR email=%s", (username, email))
+            if cursor.fetchone():
+                return "exists"
+            try:
+                cursor.execute(
+                    "INSERT INTO users (username, first_name, last_name, contact, email, password_, role) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    (username, first_name, last_name, contact, email, password, role),
+                )
+                conn.commit()
+                return "success"
+            except Exception as e:
+                print("Error creating user:", e)
+                return "invalid"
+
+    def get_user(self, username, password):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                f"SELECT {IDENTITY_FIELDS} FROM users WHERE username=%s AND password_=%s",
+                (username, password),
+            )
+            return cursor.fetchone()
+
+    def get_identity(self, username):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT {IDENTITY_FIELDS} FROM users WHERE username=%s", (username,))
+            return cursor.fetchone()
+
+    def get_all_users(self):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT username, first_name, last_name, email, contact, role FROM users")
+            return cursor.fetchall()
+
+    def delete_user(self, username):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM users WHERE username=%s", (username,))
+            conn.commit()
+
+    # ---- transactions ----
+    def add_transaction(self, username, date, category, description, amount):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO transactions (username, date, category, description, amount) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (username, date, category, description, float(amount)),
+            )
+            upsert_rollup(cursor, username, pd.DataFrame({
+                "date": [pd.Timestamp(date)], "category": [category], "amount": [float(amount)],
+            }))
+            self._refresh_day_fingerprints(cursor, username, date)
+            conn.commit()
+
+    def _hot_transactions(self, username=None, start_date=None, end_date=None, category=None):
+        query, params = transaction_query("%s", username, start_date, end_date, category)
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query, tuple(params))
+            return cursor.fetchall()
+
+    def _hot_pages(self, username=None, start_date=None, end_date=None, category=None,
+                   page_size=READ_PAGE_SIZE):
+        """Yield lists of row dicts, `page_size` at a time, by keyset pagination."""
+        after = None
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            while True:
+                query, params = transaction_query(
+                    "%s", username, start_date, end_date, category, after, page_size
+                )
+                cursor.execute(query, tuple(params))
+                page = cursor.fetchall()
+                if not page:
+                    return
+                yield page
+                if len(page) < page_size:
+                    return
+                after = (page[-1]["date"], page[-1]["id"])
+
+    def _hot_frames(self, username=None, start_date=None, end_date=None, category=None,
+                    chunk_size=READ_PAGE_SIZE):
+        """
+        Yield typed DataFrame chunks from one unbuffered cursor.
+
+        The client reads rows off the socket `chunk_size` at a time, so
+        memory stays bounded by one chunk whatever the history length. A
+        consumer that stops early leaves the rest to be drained on close
+        (see consume_results in utils.db_pool).
+        """
+        query, params = transaction_query("%s", username, start_date, end_date, category)
+        with db_connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query, tuple(params))
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield transactions_frame(rows)
+            finally:
+                cursor.close()
+
+    def _hot_frame(self, username=None, start_date=None, end_date=None, category=None):
+        frames = list(self._hot_frames(username, start_date, end_date, category))
+        if not frames:
+            return transactions_frame([])
+        return typed_transactions(pd.concat(frames, ignore_index=True))
+
+    # ---- partitions / archival ----
+    def ensure_partitions(self, months_ahead=PARTITION_MONTHS_AHEAD) -> list:
+        """
+        Split the catch-all `p_future` partition into monthly ones through
+        `months_ahead` months from now; returns the partitions created.
+
+        The first run starts at the oldest month present, later runs at the
+        month after the newest monthly partition.
+        """
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'
+                ORDER BY PARTITION_ORDINAL_POSITION
+                """
+            )
+            names = [r[0] for r in cursor.fetchall()]
+            if "p_future" not in names:
+                return []
+
+            monthly = [n for n in names if re.fullmatch(r"p\d{6}", n)]
+            if monthly:
+                start = pd.Period(f"{monthly[-1][1:5]}-{monthly[-1][5:]}", freq="M") + 1
+            else:
+                cursor.execute("SELECT MIN(date) FROM transactions PARTITION (p_future)")
+                oldest = cursor.fetchone()[0]
+                start = pd.Timestamp(oldest or pd.Timestamp.now()).to_period("M")
+            end = pd.Timestamp.now().to_period("M") + months_ahead
+            if start > end:
+                return []
+
+            months = pd.period_range(start, end, freq="M")
+            parts = [
+                f"PARTITION p{m.strftime('%Y%m')} VALUES LESS THAN "
+                f"(TO_DAYS('{(m + 1).start_time.strftime('%Y-%m-%d')}'))"
+                for m in months
+            ]
+            cursor.execute(
+                "ALTER TABLE transactions REORGANIZE PARTITION p_future INTO ("
+                + ", ".join(parts + ["PARTITION p_future VALUES LESS THAN MAXVALUE"])
+                + ")"
+            )
+            return [f"p{m.strftime('%Y%m')}" for m in months]
+
+    def hot_months_before(self, month) -> list:
+        """Months before `month` that still have rows in the hot table."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT DISTINCT month FROM transactions WHERE date < %s ORDER BY month",
+                (month_bounds(month)[0].to_pydatetime(),),
+            )
+            return [r[0] for r in cursor.fetchall()]
+
+    def hot_month_frame(self, month) -> pd.DataFrame:
+        start, end = month_bounds(month)
+        query = (
+            f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions "
+            "WHERE date >= %s AND date < %s"
+        )
+        with db_connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query, (start.to_pydatetime(), end.to_pydatetime()))
+            rows = cursor.fetchall()
+            cursor.close()
+        return transactions_frame(rows)
+
+    def drop_hot_month(self, month, ids):
+        """
+        Remove an archived month's rows from the hot table.
+
+        Exactly the archived `ids` are deleted: a row committed to the
+        month after its snapshot was read (auto-increment ids are handed
+        out before commit, so it may have a lower id) stays hot.
+        """
+        start, end = month_bounds(month)
+        ids = list(ids)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            for offset in range(0, len(ids), INSERT_BATCH_SIZE):
+                batch = ids[offset:offset + INSERT_BATCH_SIZE]
+                cursor.execute(
+                    "DELETE FROM transactions WHERE date >= %s AND date < %s "
+                    f"AND id IN ({', '.join(['%s'] * len(batch))})",
+                    (start.to_pydatetime(), end.to_pydatetime(), *batch),
+                )
+            conn.commit()
+
+    def delete_transaction(self, txn_id, username) -> bool:
+        """Delete one of the user's transactions, hot or archived; returns whether it existed."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT month, COALESCE(category, 'uncategorized'), date FROM transactions "
+                "WHERE id=%s AND username=%s",
+                (txn_id, username),
+            )
+            row = cursor.fetchone()
+            archived = self._delete_archived(username, txn_id, row[0] if row else None)
+            row = row or archived
+            if row is None:
+                return False
+            cursor.execute("DELETE FROM transactions WHERE id=%s AND username=%s", (txn_id, username))
+            self._refresh_group(cursor, username, row[0], row[1])
+            self._refresh_day_fingerprints(cursor, username, row[2])
+            conn.commit()
+            return True
+
+    # ---- fingerprints ----
+    def _refresh_day_fingerprints(self, cursor, username, date):
+        """
+        Re-derive one user's fingerprints for the day of `date` from what is
+        stored, so a deleted row can be uploaded again and a manual one is
+        recognized.
+        """
+        start, end = day_bounds(date)
+        cursor.execute(
+            "DELETE FROM transaction_fingerprints WHERE username=%s AND date=%s",
+            (username, start.date()),
+        )
+        query, params = transaction_query("%s", username, start.to_pydatetime(), end.to_pydatetime())
+        cursor.execute(query, tuple(params))
+        hot = transactions_frame(cursor.fetchall())
+        insert_fingerprints(cursor, self._day_fingerprint_records(username, date, hot))
+
+    def _users_to_backfill(self, username=None) -> list:
+        query = "SELECT username FROM users WHERE username NOT IN (SELECT username FROM fingerprint_backfills)"
+        params = ()
+        if username is not None:
+            query += " AND username=%s"
+            params = (username,)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [r[0] for r in cursor.fetchall()]
+
+    def _save_fingerprints(self, records):
+        with db_connection() as conn:
+            insert_fingerprints(conn.cursor(), records)
+            conn.commit()
+
+    def _mark_backfilled(self, username):
+        with db_connection() as conn:
+            conn.cursor().execute("INSERT IGNORE INTO fingerprint_backfills (username) VALUES (%s)", (username,))
+            conn.commit()
+
+    @contextmanager
+    def ingest_job(self, username, file_hash):
+        """Checkpointed delta ingest of one upload; see utils.ingest.IngestJob."""
+        self.backfill_fingerprints(username)
+        with operation("mysql.ingest_job"), db_connection() as conn:
+            yield IngestJob(conn, username, file_hash)
+
+    # ---- budgets ----
+    def set_budget(self, username, month, category, amount):
+        self.set_budgets(username, [(month, category, amount)])
+
+    def set_budgets(self, username, records) -> int:
+        """Upsert (month, category, amount) records in one transaction; returns how many."""
+        with db_connection() as conn:
+            written = upsert_budget_records(conn.cursor(), username, records)
+            conn.commit()
+            return written
+
+    def get_budget(self, username, month):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT category, budget_amount FROM budgets WHERE username=%s AND month=%s",
+                (username, month),
+            )
+            return cursor.fetchall()
+
+    def get_budgets_between(self, username, start_month, end_month):
+        """Budgets of months in [start_month, end_month]; a range scan of the primary key."""
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                "SELECT month, category, budget_amount FROM budgets "
+                "WHERE username=%s AND month BETWEEN %s AND %s ORDER BY month, category",
+                (username, start_month, end_month),
+            )
+            return cursor.fetchall()
+
+    def get_all_budgets(self):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM budgets")
+            return cursor.fetchall()
+
+    # ---- categories ----
+    def add_category(self, name, color="#FF0000"):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM categories WHERE name=%s", (name,))
+            if cursor.fetchone():
+                cursor.execute("UPDATE categories SET color=%s WHERE name=%s", (color, name))
+            else:
+                cursor.execute("INSERT INTO categories (name, color) VALUES (%s, %s)", (name, color))
+            conn.commit()
+
+    def get_categories(self):
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM categories")
+            return [r[0] for r in cursor.fetchall()]
+
+    # ---- rollup ----
+    def _refresh_group(self, cursor, username, month, category):
+        """Recompute one rollup group from its hot and archived transactions (after a delete)."""
+        cursor.execute(
+            "DELETE FROM monthly_category_totals WHERE username=%s AND month=%s AND category=%s",
+            (username, month, category),
+        )
+        cursor.execute(
+            "INSERT INTO monthly_category_totals "
+            + ROLLUP_SELECT.format(
+                where="WHERE username=%s AND month=%s AND COALESCE(category, 'uncategorized')=%s"
+            ),
+            (username, month, category),
+        )
+        archived = archive_rollup(username, month, category)
+        if not archived.empty:
+            upsert_rollup_records(cursor, list(archived.itertuples(index=False, name=None)))
+
+    def rebuild_rollup(self, username=None) -> int:
+        """Recompute monthly_category_totals from transactions; returns the group count."""
+        where, params = ("WHERE username=%s", (username,)) if username else ("", ())
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM monthly_category_totals {where}", params)
+            cursor.execute("INSERT INTO monthly_category_totals " + ROLLUP_SELECT.format(where=where), params)
+            groups = cursor.rowcount
+            archived = archive_rollup(username)
+            if not archived.empty:
+                upsert_rollup_records(cursor, list(archived.itertuples(index=False, name=None)))
+                cursor.execute(f"SELECT COUNT(*) FROM monthly_category_totals {where}", params)
+                groups = cursor.fetchone()[0]
+            conn.commit()
+            return groups
+
+    def check_rollup(self, username=None) -> pd.DataFrame:
+        """Groups where monthly_category_totals disagrees with the transactions."""
+        where, params = ("WHERE username=%s", (username,)) if username else ("", ())
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(ROLLUP_SELECT.format(where=where), params)
+            expected = pd.DataFrame(cursor.fetchall(), columns=ROLLUP_TABLE_COLUMNS)
+            cursor.execute(f"SELECT * FROM monthly_category_totals {where}", params)
+            actual = pd.DataFrame(cursor.fetchall(), columns=ROLLUP_TABLE_COLUMNS)
+        return compare_rollups(merge_rollups(expected, archive_rollup(username)), actual)
+
+    # ---- analytics ----
+    def get_monthly_summary(self, username):
+        """Spending per (month, category), newest month first."""
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT month, category, total AS total_spent
+                FROM monthly_category_totals
+                WHERE username = %s
+                ORDER BY month DESC
+                """,
+                (username,),
+            )
+            return cursor.fetchall()
+
+    def get_budget_vs_actual(self, username, month):
+        """Each budgeted category of `month` with what was actually spent."""
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT b.category, b.budget_amount, COALESCE(r.total, 0) AS total_spent
+                FROM budgets b
+                LEFT JOIN monthly_category_totals r
+                    ON r.username=b.username AND r.month=b.month AND r.category=b.category
+                WHERE b.username=%s AND b.month=%s
+                """,
+                (username, month),
+            )
+            return cursor.fetchall()
+
+    def get_overspending_data(self):
+        """(username, month, category) groups whose spending exceeds the budget."""
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT r.username, r.month, r.category, r.total AS total_spent, b.budget_amount
+                FROM monthly_category_totals r
+                JOIN budgets b ON r.username=b.username AND r.month=b.month AND r.category=b.category
+                WHERE r.total > b.budget_amount
+                ORDER BY r.month DESC
+                """
+            )
+            rows = cursor.fetchall()
+        for r in rows:
+            r["Overspending"] = r["total_spent"] - r["budget_amount"]
+        return rows
+
+    # ---- forecasts ----
+    def iter_monthly_totals(self, chunk_size=READ_PAGE_SIZE):
+        """Stream every user's monthly category totals, `chunk_size` rows at a time (see _hot_frames)."""
+        with db_connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(MONTHLY_TOTALS_QUERY)
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        return
+                    yield monthly_totals_frame(rows)
+            finally:
+                cursor.close()
+
+    def save_forecasts(self, forecast: pd.DataFrame, usernames) -> int:
+        """
+        Replace the stored forecasts of `usernames` with `forecast` in one
+        transaction; users without a new forecast are left with none.
+        """
+        users = list(usernames)
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(users), READ_PAGE_SIZE):
+                batch = users[start:start + READ_PAGE_SIZE]
+                cursor.execute(
+                    f"DELETE FROM forecasts WHERE username IN ({', '.join(['%s'] * len(batch))})", batch
+                )
+            written = (
+                insert_rows(cursor, "forecasts", FORECAST_FIELDS, forecast_records(forecast))
+                if not forecast.empty else 0
+            )
+            conn.commit()
+            return written
+
+    def record_forecast_run(self, report: dict):
+        with db_connection() as conn:
+            insert_rows(conn.cursor(), "forecast_runs", FORECAST_RUN_FIELDS,
+                        [tuple(report[f] for f in FORECAST_RUN_FIELDS)])
+            conn.commit()
+
+    def get_forecasts(self, username):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                """
+                SELECT f.category, f.month, f.horizon, f.prediction, r.started_at AS generated_at
+                FROM forecasts f
+                LEFT JOIN forecast_runs r ON r.run_id = f.run_id
+                WHERE f.username=%s
+                ORDER BY f.category, f.horizon
+                """,
+                (username,),
+            )
+            return cursor.fetchall()
+
+
+# ---------------------- EMBEDDED ----------------------
+@instrument_methods("embedded")
+class EmbeddedStorage(TransactionReads):
+    """
+    In-process columnar backend on a DuckDB file.
+
+    Transactions carry a precomputed `month` column, so the month/category
+    aggregations are vectorized GROUP BYs over two columns with no date
+    formatting per row. One connection serves the whole process; calls
+    are serialized by a lock.
+    """
+
+    name = "embedded"
+
+    def __init__(self, path=EMBEDDED_DB_PATH):
+        import duckdb
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = duckdb.connect(path)
+        self._lock = threading.RLock()
+        migrate(self._conn, "embedded")
+
+    def _records(self, query, params=()):
+        with self._lock:
+            started = time.perf_counter()
+            result = self._conn.execute(query, params)
+            executed = time.perf_counter()
+            rows = result.df().to_dict("records")
+        self._record(query, params, started, executed, len(rows))
+        return rows
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            started = time.perf_counter()
+            self._conn.execute(query, params)
+        self._record(query, params, started, time.perf_counter(), 0)
+
+    @contextmanager
+    def _transaction(self):
+        """
+        BEGIN ... COMMIT on the shared connection; call with the lock held.
+
+        A failing statement rolls the transaction back before re-raising,
+        otherwise every later query on the connection would fail as aborted.
+        """
+        self._conn.execute("BEGIN TRANSACTION")
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _record(self, query, params, started, executed, rows):
+        execute_ms = (executed - started) * 1000
+        fetch_ms = (time.perf_counter() - executed) * 1000
+        record("execute", execute_ms)
+        record("fetch", fetch_ms, rows)
+        if execute_ms + fetch_ms >= SLOW_QUERY_MS:
+            log_slow_query(query, params, execute_ms, fetch_ms, rows)
+
+    # ---- users ----
+    def ensure_user(self, username):
+        self._execute(
+            f"INSERT INTO users ({USER_FIELDS}) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+            (username, username, username, "9999999999", f"{username}@example.com", "password", "user"),
+        )
+
+    def create_user(self, username, first_name, last_name, contact, email, password, role="user"):
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM users WHERE username=? OR email=?", (username, email)
+            ).fetchone()
+            if exists:
+                return "exists"
+            try:
+                self._conn.execute(
+                    f"INSERT INTO users ({USER_FIELDS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (username, first_name, last_name, contact, email, password, role),
+                )
+                return "success"
+            except Exception as e:
+                print("Error creating user:", e)
+                return "invalid"
+
+    def get_user(self, username, password):
+        rows = self._records(
+            f"SELECT {IDENTITY_FIELDS} FROM users WHERE username=? AND password_=?", (username, password)
+        )
+        return rows[0] if rows else None
+
+    def get_identity(self, username):
+        rows = self._records(f"SELECT {IDENTITY_FIELDS} FROM users WHERE username=?", (username,))
+        return rows[0] if rows else None
+
+    def get_all_users(self):
+        return self._records("SELECT username, first_name, last_name, email, contact, role FROM users")
+
+    def delete_user(self, username):
+        self._execute("DELETE FROM users WHERE username=?", (username,))
+
+    # ---- transactions ----
+    def add_transaction(self, username, date, category, description, amount):
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "INSERT INTO transactions (username, date, month, category, description, amount) "
+                "VALUES (?, CAST(? AS TIMESTAMP), strftime(CAST(? AS TIMESTAMP), '%Y-%m'), ?, ?, ?)",
+                (username, date, date, category, description, float(amount)),
+            )
+            self._conn.execute(
+                "INSERT INTO monthly_category_totals VALUES "
+                "(?, strftime(CAST(? AS TIMESTAMP), '%Y-%m'), COALESCE(?, 'uncategorized'), ?, 1, ?, ?, ?)"
+                + EMBEDDED_ROLLUP_MERGE,
+                (username, date, category, float(amount), float(amount), float(amount), max(float(amount), 0.0)),
+            )
+            self._refresh_day_fingerprints(username, date)
+
+    def _hot_transactions(self, username=None, start_date=None, end_date=None, category=None):
+        query, params = transaction_query("?", username, start_date, end_date, category)
+        return self._records(query, params)
+
+    def _hot_pages(self, username=None, start_date=None, end_date=None, category=None,
+                   page_size=READ_PAGE_SIZE):
+        after = None
+        while True:
+            query, params = transaction_query("?", username, start_date, end_date, category, after, page_size)
+            page = self._records(query, params)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1]["date"], page[-1]["id"])
+
+    def _hot_frames(self, username=None, start_date=None, end_date=None, category=None,
+                    chunk_size=READ_PAGE_SIZE):
+        """Yield typed DataFrame chunks streamed as Arrow record batches."""
+        query, params = transaction_query("?", username, start_date, end_date, category)
+        # A cursor is a separate connection to the same database, so the
+        # stream does not hold the storage lock between chunks.
+        cursor = self._conn.cursor()
+        try:
+            reader = cursor.execute(query, params).fetch_record_batch(chunk_size)
+            for batch in reader:
+                yield typed_transactions(batch.to_pandas())
+        finally:
+            cursor.close()
+
+    def _hot_frame(self, username=None, start_date=None, end_date=None, category=None):
+        query, params = transaction_query("?", username, start_date, end_date, category)
+        cursor = self._conn.cursor()
+        try:
+            return typed_transactions(cursor.execute(query, params).df())
+        finally:
+            cursor.close()
+
+    # ---- archival ----
+    def hot_months_before(self, month) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT month FROM transactions WHERE month < ? ORDER BY month", (month,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def hot_month_frame(self, month) -> pd.DataFrame:
+        with self._lock:
+            df = self._conn.execute(
+                f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE month = ?", (month,)
+            ).df()
+        return typed_transactions(df)
+
+    def drop_hot_month(self, month, ids):
+        with self._lock, self._transaction():
+            self._conn.register("archived_ids", pd.DataFrame({"id": list(ids)}, dtype="int64"))
+            try:
+                self._conn.execute(
+                    "DELETE FROM transactions WHERE month = ? AND id IN (SELECT id FROM archived_ids)", (month,)
+                )
+            finally:
+                self._conn.unregister("archived_ids")
+
+    def delete_transaction(self, txn_id, username) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT month, COALESCE(category, 'uncategorized'), date FROM transactions "
+                "WHERE id=? AND username=?",
+                (txn_id, username),
+            ).fetchone()
+            archived = self._delete_archived(username, txn_id, row[0] if row else None)
+            row = row or archived
+            if row is None:
+                return False
+            with self._transaction():
+                self._conn.execute("DELETE FROM transactions WHERE id=? AND username=?", (txn_id, username))
+                self._refresh_group(username, row[0], row[1])
+                self._refresh_day_fingerprints(username, row[2])
+            return True
+
+    # ---- fingerprints ----
+    def _insert_fingerprint_records(self, records):
+        if not records:
+            return
+        self._conn.register("fingerprint_rows", pd.DataFrame(records, columns=list(FINGERPRINT_COLUMNS)))
+        try:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO transaction_fingerprints "
+                "SELECT username, CAST(fingerprint AS UBIGINT), CAST(date AS DATE) FROM fingerprint_rows"
+            )
+        finally:
+            self._conn.unregister("fingerprint_rows")
+
+    def _refresh_day_fingerprints(self, username, date):
+        """Same as MySQLStorage._refresh_day_fingerprints; call with the lock held."""
+        start, end = day_bounds(date)
+        self._conn.execute(
+            "DELETE FROM transaction_fingerprints WHERE username=? AND date=?", (username, start.date())
+        )
+        query, params = transaction_query("?", username, start.to_pydatetime(), end.to_pydatetime())
+        hot = typed_transactions(self._conn.execute(query, params).df())
+        self._insert_fingerprint_records(self._day_fingerprint_records(username, date, hot))
+
+    def _users_to_backfill(self, username=None) -> list:
+        query = "SELECT username FROM users WHERE username NOT IN (SELECT username FROM fingerprint_backfills)"
+        params = ()
+        if username is not None:
+            query += " AND username=?"
+            params = (username,)
+        with self._lock:
+            return [r[0] for r in self._conn.execute(query, params).fetchall()]
+
+    def _save_fingerprints(self, records):
+        with self._lock:
+            self._insert_fingerprint_records(records)
+
+    def _mark_backfilled(self, username):
+        self._execute("INSERT OR IGNORE INTO fingerprint_backfills (username) VALUES (?)", (username,))
+
+    @contextmanager
+    def ingest_job(self, username, file_hash):
+        """Checkpointed delta ingest of one upload; same contract as IngestJob."""
+        self.backfill_fingerprints(username)
+        with operation("embedded.ingest_job"):
+            yield _EmbeddedIngestJob(self._conn, self._lock, username, file_hash)
+
+    # ---- budgets ----
+    def set_budget(self, username, month, category, amount):
+        self.set_budgets(username, [(month, category, amount)])
+
+    def set_budgets(self, username, records) -> int:
+        frame = pd.DataFrame(list(records), columns=["month", "category", "budget_amount"])
+        frame["budget_amount"] = frame["budget_amount"].astype(float)
+        with self._lock:
+            self._conn.register("budget_rows", frame)
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO budgets
+                    SELECT ?, month, category, budget_amount FROM budget_rows
+                    ON CONFLICT (username, month, category)
+                    DO UPDATE SET budget_amount = excluded.budget_amount
+                    """,
+                    (username,),
+                )
+            finally:
+                self._conn.unregister("budget_rows")
+        return len(frame)
+
+    def get_budget(self, username, month):
+        return self._records(
+            "SELECT category, budget_amount FROM budgets WHERE username=? AND month=?",
+            (username, month),
+        )
+
+    def get_budgets_between(self, username, start_month, end_month):
+        return self._records(
+            "SELECT month, category, budget_amount FROM budgets "
+            "WHERE username=? AND month BETWEEN ? AND ? ORDER BY month, category",
+            (username, start_month, end_month),
+        )
+
+    def get_all_budgets(self):
+        return self._records("SELECT * FROM budgets")
+
+    # ---- categories ----
+    def add_category(self, name, color="#FF0000"):
+        self._execute(
+            "INSERT INTO categories VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET color = excluded.color",
+            (name, color),
+        )
+
+    def get_categories(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT name FROM categories").fetchall()]
+
+    # ---- rollup ----
+    def _merge_rollup_frame(self, rollup: pd.DataFrame):
+        """Fold ROLLUP_TABLE_COLUMNS rows into monthly_category_totals."""
+        if rollup.empty:
+            return
+        self._conn.register("archived_rollup", rollup)
+        try:
+            self._conn.execute(
+                "INSERT INTO monthly_category_totals SELECT * FROM archived_rollup" + EMBEDDED_ROLLUP_MERGE
+            )
+        finally:
+            self._conn.unregister("archived_rollup")
+
+    def _refresh_group(self, username, month, category):
+        """Recompute one rollup group from its hot and archived transactions (after a delete)."""
+        self._conn.execute(
+            "DELETE FROM monthly_category_totals WHERE username=? AND month=? AND category=?",
+            (username, month, category),
+        )
+        self._conn.execute(
+            "INSERT INTO monthly_category_totals "
+            + ROLLUP_SELECT.format(
+                where="WHERE username=? AND month=? AND COALESCE(category, 'uncategorized')=?"
+            ),
+            (username, month, category),
+        )
+        self._merge_rollup_frame(archive_rollup(username, month, category))
+
+    def rebuild_rollup(self, username=None) -> int:
+        where, params = ("WHERE username=?", (username,)) if username else ("", ())
+        with self._lock:
+            with self._transaction():
+                self._conn.execute(f"DELETE FROM monthly_category_totals {where}", params)
+                self._conn.execute("INSERT INTO monthly_category_totals " + ROLLUP_SELECT.format(where=where), params)
+                self._merge_rollup_frame(archive_rollup(username))
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM monthly_category_totals {where}", params
+            ).fetchone()[0]
+
+    def check_rollup(self, username=None) -> pd.DataFrame:
+        where, params = ("WHERE username=?", (username,)) if username else ("", ())
+        with self._lock:
+            expected = self._conn.execute(ROLLUP_SELECT.format(where=where), params).df()
+            actual = self._conn.execute(f"SELECT * FROM monthly_category_totals {where}", params).df()
+        return compare_rollups(merge_rollups(expected, archive_rollup(username)), actual)
+
+    # ---- analytics ----
+    def get_monthly_summary(self, username):
+        return self._records(
+            """
+            SELECT month, category, total AS total_spent
+            FROM monthly_category_totals
+            WHERE username = ?
+            ORDER BY month DESC
+            """,
+            (username,),
+        )
+
+    def get_budget_vs_actual(self, username, month):
+        return self._records(
+            """
+            SELECT b.category, b.budget_amount, COALESCE(r.total, 0) AS total_spent
+            FROM budgets b
+            LEFT JOIN monthly_category_totals r USING (username, month, category)
+            WHERE b.username=? AND b.month=?
+            """,
+            (username, month),
+        )
+
+    def get_overspending_data(self):
+        rows = self._records(
+            """
+            SELECT r.username, r.month, r.category, r.total AS total_spent, b.budget_amount
+            FROM monthly_category_totals r
+            JOIN budgets b USING (username, month, category)
+            WHERE r.total > b.budget_amount
+            ORDER BY r.month DESC
+            """
+        )
+        for r in rows:
+            r["Overspending"] = r["total_spent"] - r["budget_amount"]
+        return rows
+
+    # ---- forecasts ----
+    def iter_monthly_totals(self, chunk_size=READ_PAGE_SIZE):
+        cursor = self._conn.cursor()
+        try:
+            reader = cursor.execute(MONTHLY_TOTALS_QUERY).fetch_record_batch(chunk_size)
+            for batch in reader:
+                yield monthly_totals_frame(batch.to_pandas())
+        finally:
+            cursor.close()
+
+    def save_forecasts(self, forecast: pd.DataFrame, usernames) -> int:
+        rows = forecast[list(FORECAST_FIELDS)] if not forecast.empty else None
+        users = pd.DataFrame({"username": list(usernames)}, dtype=object)
+        with self._lock:
+            self._conn.register("forecast_users", users)
+            if rows is not None:
+                self._conn.register("forecast_rows", rows)
+            try:
+                with self._transaction():
+                    self._conn.execute(
+                        "DELETE FROM forecasts WHERE username IN (SELECT username FROM forecast_users)"
+                    )
+                    if rows is not None:
+                        self._conn.execute(
+                            f"INSERT INTO forecasts SELECT {', '.join(FORECAST_FIELDS)} FROM forecast_rows"
+                        )
+            finally:
+                self._conn.unregister("forecast_users")
+                if rows is not None:
+                    self._conn.unregister("forecast_rows")
+        return 0 if rows is None else len(rows)
+
+    def record_forecast_run(self, report: dict):
+        self._execute(
+            f"INSERT INTO forecast_runs ({', '.join(FORECAST_RUN_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            tuple(report[f] for f in FORECAST_RUN_FIELDS),
+        )
+
+    def get_forecasts(self, username):
+        return self._records(
+            """
+            SELECT f.category, f.month, f.horizon, f.prediction, r.started_at AS generated_at
+            FROM forecasts f
+            LEFT JOIN forecast_runs r USING (run_id)
+            WHERE f.username=?
+            ORDER BY f.category, f.horizon
+            """,
+            (username,),
+        )
+
+
+class _EmbeddedIngestJob:
+    """
+    DuckDB counterpart of utils.ingest.IngestJob.
+
+    Each chunk is one transaction: new rows are found with an anti-join
+    against the stored fingerprints and inserted set-wise together with
+    their fingerprints, their rollup totals and the job checkpoint. The
+    storage lock is held per chunk only, so other sessions are served
+    between chunks.
+    """
+
+    def __init__(self, conn, lock, username, file_hash, account=""):
+        self.conn = conn
+        self.lock = lock
+        self.username = username
+        self.file_hash = file_hash
+        self.fingerprinter = RowFingerprinter(account)
+
+        with lock:
+            row = conn.execute(
+                "SELECT rows_committed, status FROM ingest_jobs WHERE username=? AND file_hash=?",
+                (username, file_hash),
+            ).fetchone()
+            if row:
+                self.rows_committed, self.status = int(row[0]), row[1]
+            else:
+                conn.execute(
+                    "INSERT INTO ingest_jobs (username, file_hash) VALUES (?, ?)",
+                    (username, file_hash),
+                )
+                self.rows_committed, self.status = 0, "running"
+
+        self.resumed_from = self.rows_committed
+        self._position = 0
+        self._summary = {"rows": 0, "inserted": 0, "skipped": 0, "seconds": 0.0}
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+    @property
+    def summary(self) -> dict:
+        return {**self._summary, "resumed_from": self.resumed_from}
+
+    def ingest(self, df: pd.DataFrame, progress_callback=None, **kwargs):
+        if self.done:
+            return None
+
+        start = self._position
+        self._position += len(df)
+        skip = min(max(self.rows_committed - start, 0), len(df))
+        if skip:
+            self.fingerprinter(df.iloc[:skip])
+        if skip == len(df):
+            return None
+
+        started = time.perf_counter()
+        df = df.iloc[skip:]
+        chunk = pd.DataFrame({
+            "date": df["date"].to_numpy(),
+            "month": df["date"].dt.strftime("%Y-%m").to_numpy(),
+            "category": (
+                df["category"].to_numpy() if "category" in df.columns else "uncategorized"
+            ),
+            "description": df["description"].to_numpy(),
+            "amount": df["amount"].astype(float).to_numpy(),
+            "fingerprint": self.fingerprinter(df).to_numpy(),
+        })
+
+        conn = self.conn
+        with self.lock:
+            conn.register("ingest_chunk", chunk)
+            try:
+                conn.execute("BEGIN TRANSACTION")
+                conn.execute(
+                    """
+                    CREATE OR REPLACE TEMP TABLE ingest_new AS
+                    SELECT c.* FROM ingest_chunk c
+                    ANTI JOIN (
+                        SELECT fingerprint FROM transaction_fingerprints WHERE username = ?
+                    ) f ON c.fingerprint = f.fingerprint
+                    """,
+                    (self.username,),
+                )
+                inserted = conn.execute("SELECT COUNT(*) FROM ingest_new").fetchone()[0]
+                conn.execute(
+                    "INSERT INTO transactions (username, date, month, category, description, amount) "
+                    "SELECT ?, date, month, category, description, amount FROM ingest_new",
+                    (self.username,),
+                )
+                conn.execute(
+                    "INSERT INTO monthly_category_totals "
+                    "SELECT ?, month, COALESCE(category, 'uncategorized'), "
+                    "SUM(amount), COUNT(*), MIN(amount), MAX(amount), SUM(GREATEST(amount, 0)) "
+                    "FROM ingest_new GROUP BY month, COALESCE(category, 'uncategorized')"
+                    + EMBEDDED_ROLLUP_MERGE,
+                    (self.username,),
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO transaction_fingerprints "
+                    "SELECT ?, fingerprint, CAST(date AS DATE) FROM ingest_new",
+                    (self.username,),
+                )
+                conn.execute(
+                    "UPDATE ingest_jobs SET rows_committed=?, updated_at=current_timestamp "
+                    "WHERE username=? AND file_hash=?",
+                    (start + skip + len(chunk), self.username, self.file_hash),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("DROP TABLE IF EXISTS ingest_new")
+                conn.unregister("ingest_chunk")
+
+        self.rows_committed = start + skip + len(chunk)
+        seconds = time.perf_counter() - started
+        self._summary["rows"] += len(chunk)
+        self._summary["inserted"] += inserted
+        self._summary["skipped"] += len(chunk) - inserted
+        self._summary["seconds"] += seconds
+        if progress_callback:
+            progress_callback(inserted, inserted)
+        return {
+            "rows": inserted,
+            "batches": 1,
+            "seconds": seconds,
+            "rows_per_sec": inserted / seconds if seconds > 0 else 0.0,
+            "skipped": len(chunk) - inserted,
+        }
+
+    def finish(self):
+        if self.done:
+            return
+        with self.lock:
+            self.conn.execute(
+                "UPDATE ingest_jobs SET status='done', updated_at=current_timestamp "
+                "WHERE username=? AND file_hash=?",
+                (self.username, self.file_hash),
+            )
+        self.status = "done"
+
+
+# ---------------------- SELECTION ----------------------
+def get_storage():
+    """Return the process-wide storage backend chosen by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "embedded":
+                    _storage = EmbeddedStorage()
+                elif STORAGE_BACKEND == "mysql":
+                    _storage = MySQLStorage()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+    return _storage
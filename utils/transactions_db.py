@@ -1,75 +1,41 @@
-import mysql.connector
-from datetime import datetime
+from utils.db_pool import get_connection
+from utils.storage import get_storage
 
 # ---------------------- CONNECTION ----------------------
 def get_db_connection():
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="62929",
-        database="finance_tracker"
-    )
-    return conn
+    """Pooled connection; `close()` hands it back to the pool."""
+    return get_connection()
 
 # ---------------------- TRANSACTIONS ----------------------
 def add_transaction(username, date, category, description, amount):
     """Insert a new transaction."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO transactions (username, date, category, description, amount) "
-            "VALUES (%s, %s, %s, %s, %s)",
-            (username, date, category, description, amount)
-        )
-        conn.commit()
+        get_storage().add_transaction(username, date, category, description, amount)
     except Exception as e:
         print("Error inserting transaction:", e)
-    finally:
-        conn.close()
 
 def get_transactions(username, start_date=None, end_date=None, category=None):
     """Fetch transactions with optional filters."""
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    return get_storage().get_transactions(username, start_date, end_date, category)
 
-    query = "SELECT * FROM transactions WHERE username = %s"
-    params = [username]
+def iter_transaction_pages(username, start_date=None, end_date=None, category=None, page_size=None):
+    """Yield the filtered transactions in keyset-paginated pages of row dicts."""
+    kwargs = {"page_size": page_size} if page_size else {}
+    return get_storage().iter_transaction_pages(username, start_date, end_date, category, **kwargs)
 
-    if start_date and end_date:
-        query += " AND date BETWEEN %s AND %s"
-        params.extend([start_date, end_date])
-    if category:
-        query += " AND category = %s"
-        params.append(category)
+def iter_transaction_frames(username, start_date=None, end_date=None, category=None, chunk_size=None):
+    """Yield the filtered transactions as typed DataFrame chunks."""
+    kwargs = {"chunk_size": chunk_size} if chunk_size else {}
+    return get_storage().iter_transaction_frames(username, start_date, end_date, category, **kwargs)
 
-    cursor.execute(query, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+def get_transactions_frame(username, start_date=None, end_date=None, category=None):
+    """Fetch the filtered transactions as one typed DataFrame."""
+    return get_storage().get_transactions_frame(username, start_date, end_date, category)
 
 def delete_transaction(txn_id, username):
-    """Delete a transaction by ID (for the logged-in user)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM transactions WHERE id=%s AND username=%s", (txn_id, username))
-    conn.commit()
-    conn.close()
+    """Delete a transaction by ID (for the logged-in user); returns whether it existed."""
+    return get_storage().delete_transaction(txn_id, username)
 
 def get_monthly_summary(username):
     """Aggregate spending by category and month."""
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute(
-        """
-        SELECT DATE_FORMAT(date, '%Y-%m') AS month, category, SUM(amount) AS total_spent
-        FROM transactions
-        WHERE username = %s
-        GROUP BY DATE_FORMAT(date, '%Y-%m'), category
-        ORDER BY month DESC
-        """,
-        (username,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    return get_storage().get_monthly_summary(username)
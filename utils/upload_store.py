@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.normalize import mark_normalized
+
+STORE_DIR = os.path.join("data", "store")
+MAX_STORE_BYTES = int(os.getenv("UPLOAD_STORE_MAX_MB", 512)) * 1024 * 1024
+MAX_AGE_DAYS = int(os.getenv("UPLOAD_STORE_MAX_AGE_DAYS", 90))
+
+
+# ---------------------- PATHS ----------------------
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def raw_path(kind: str, digest: str) -> str:
+    return os.path.join(STORE_DIR, f"{kind}_{digest}.csv")
+
+
+def parsed_key(layout: dict) -> str:
+    """Hash of how a file is parsed (see csv_parser.resolve_layout)."""
+    return content_hash(json.dumps(layout, sort_keys=True, default=str).encode())[:16]
+
+
+def parsed_path(kind: str, digest: str, key: str) -> str:
+    # Same stem as the raw file, so retention treats them as one entry.
+    return os.path.join(STORE_DIR, f"{kind}_{digest}.{key}.parquet")
+
+
+def _tmp_path(path: str) -> str:
+    # Unique per write: sessions are threads of one process, so two of
+    # them storing the same upload must not share a temp file.
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = _tmp_path(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# ---------------------- STORE ----------------------
+def save_raw(data: bytes, kind: str):
+    """
+    Store an uploaded file under the hash of its content.
+
+    Returns (digest, path); identical re-uploads reuse the existing copy.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    digest = content_hash(data)
+    path = raw_path(kind, digest)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        _write_atomic(path, data)
+    return digest, path
+
+
+def load_parsed(kind: str, digest: str, key: str):
+    """
+    Return the cached parsed frame for an upload, or None on a miss.
+
+    `key` is the parsed_key of the layout; a parser or format change gives
+    a new key, so stale parses are never served.
+    """
+    path = parsed_path(kind, digest, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Discarding unreadable cache entry {path}: {e}")
+        os.remove(path)
+        return None
+    os.utime(path)
+    return mark_normalized(df)
+
+
+def save_parsed(kind: str, digest: str, key: str, df: pd.DataFrame):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = parsed_path(kind, digest, key)
+    tmp_path = _tmp_path(path)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class _ParsedWriter:
+    def __init__(self, tmp_path: str):
+        self.tmp_path = tmp_path
+        self._writer = None
+
+    def write(self, chunk: pd.DataFrame):
+        if self._writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            self._writer = pq.ParquetWriter(self.tmp_path, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self) -> bool:
+        if self._writer is None:
+            return False
+        self._writer.close()
+        return True
+
+
+@contextmanager
+def parsed_writer(kind: str, digest: str, key: str):
+    """
+    Write the parsed copy of an upload one chunk at a time.
+
+    The entry only appears once the block finishes without an error, so a
+    failed parse never leaves a partial cache behind.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = parsed_path(kind, digest, key)
+    writer = _ParsedWriter(_tmp_path(path))
+    try:
+        yield writer
+    except BaseException:
+        writer.close()
+        if os.path.exists(writer.tmp_path):
+            os.remove(writer.tmp_path)
+        raise
+    if writer.close():
+        os.replace(writer.tmp_path, path)
+
+
+# ---------------------- RETENTION ----------------------
+def gc_store(max_bytes: int = MAX_STORE_BYTES, max_age_days: int = MAX_AGE_DAYS) -> dict:
+    """
+    Evict store entries older than `max_age_days`, then the least recently
+    used ones until the store fits in `max_bytes`.
+
+    An entry is the raw file plus its parsed copies; they go together.
+    """
+    if not os.path.isdir(STORE_DIR):
+        return {"removed": 0, "freed_bytes": 0, "total_bytes": 0}
+
+    entries = {}
+    for name in os.listdir(STORE_DIR):
+        path = os.path.join(STORE_DIR, name)
+        if name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        entry = entries.setdefault(name.split(".", 1)[0], {"paths": [], "bytes": 0, "used": 0})
+        entry["paths"].append(path)
+        entry["bytes"] += stat.st_size
+        entry["used"] = max(entry["used"], stat.st_mtime)
+
+    total = sum(e["bytes"] for e in entries.values())
+    cutoff = time.time() - max_age_days * 86400
+    removed, freed = 0, 0
+
+    for key in sorted(entries, key=lambda k: entries[k]["used"]):
+        entry = entries[key]
+        if entry["used"] >= cutoff and total <= max_bytes:
+            break
+        for path in entry["paths"]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= entry["bytes"]
+        freed += entry["bytes"]
+        removed += 1
+
+    return {"removed": removed, "freed_bytes": freed, "total_bytes": total}